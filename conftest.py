@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_environment():
+    """Временные файловые кеши и тихие логи тестов, см. core.testing."""
+    from core.testing import isolated_environment
+
+    with isolated_environment():
+        yield
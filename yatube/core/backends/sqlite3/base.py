@@ -0,0 +1,37 @@
+"""SQLite с настраиваемыми PRAGMA и режимом транзакций.
+
+Помимо аргументов sqlite3.connect, в OPTIONS понимает:
+
+    'pragmas': {'journal_mode': 'wal', 'synchronous': 'normal', ...}
+        выполняются на каждом новом соединении;
+    'transaction_mode': 'IMMEDIATE'
+        BEGIN IMMEDIATE берет блокировку записи в начале atomic(),
+        а не при первой записи: параллельные писатели ждут timeout,
+        вместо того чтобы сразу получить «database is locked».
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop(
+            'transaction_mode', 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}.')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,71 @@
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+LOCK_KEY = '{}:lock'
+# Сколько живет блокировка пересчета, если воркер упал, не сняв ее.
+LOCK_TIMEOUT = 30
+# Сколько ждать чужого пересчета, когда устаревшей копии нет вовсе.
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+# Сколько хранить устаревшую копию после истечения timeout.
+STALE_GRACE = 24 * 60 * 60
+
+
+def _is_fresh(entry, version, beta):
+    if entry['version'] != version:
+        return False
+    if entry['expires'] is None:
+        return True
+    # XFetch: чем дольше считалось значение и чем ближе срок,
+    # тем вероятнее кто-то пересчитает его заранее.
+    jitter = entry['delta'] * beta * -math.log(1.0 - random.random())
+    return time.time() + jitter < entry['expires']
+
+
+def get_or_compute(key, compute, version=None, timeout=None, beta=1.0):
+    """Значение из кеша с защитой от одновременного пересчета.
+
+    Пересчитывает только тот, кто взял блокировку; остальные в это
+    время получают устаревшую копию. Устаревшей считается копия
+    другой версии или с истекшим (с учетом XFetch) timeout.
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, beta):
+        return entry['value']
+    if (entry is not None and entry['version'] != version
+            and hasattr(cache, 'get_shared')):
+        # Локальная копия двухуровневого кеша могла отстать:
+        # другой воркер, возможно, уже пересчитал значение.
+        entry = cache.get_shared(key) or entry
+        if _is_fresh(entry, version, beta):
+            return entry['value']
+
+    lock_key = LOCK_KEY.format(key)
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            return entry['value']
+        deadline = time.time() + LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version:
+                return entry['value']
+        return compute()
+
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        if value is not None:
+            cache.set(key, {
+                'value': value,
+                'version': version,
+                'expires': started + timeout if timeout else None,
+                'delta': delta,
+            }, timeout + STALE_GRACE if timeout else None)
+        return value
+    finally:
+        cache.delete(lock_key)
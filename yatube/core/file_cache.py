@@ -0,0 +1,93 @@
+"""Файловый кеш, пригодный для L2 core.tiered_cache на одной машине.
+
+У FileBasedCache из Django add и incr — чтение, затем запись: два
+процесса могут одновременно взять одну блокировку get_or_compute
+или потерять инкремент версии. Здесь оба выполняются под файловой
+блокировкой каталога кеша.
+
+FileBasedCache к тому же на каждый set перечисляет весь каталог
+(_cull), а при переполнении удаляет случайные файлы — в том числе
+версии данных и блокировки пересчета. Здесь каталог проверяется раз
+в CULL_EVERY записей процесса, а ключи с префиксами из PERSISTENT
+и блокировки лежат в подкаталоге, который вытеснение не трогает.
+
+Общий такой кеш только для процессов одной машины; нескольким
+машинам нужен Redis или Memcached, у которых add и incr атомарны.
+
+    'shared': {
+        'BACKEND': 'core.file_cache.LockingFileBasedCache',
+        'LOCATION': '/var/tmp/yatube-cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'PERSISTENT': ['posts:version:']},
+    }
+"""
+import itertools
+import os
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from .cache import LOCK_KEY
+
+PERSISTENT_DIR = 'persistent'
+LOCK_FILE = '.lock'
+
+
+class LockingFileBasedCache(FileBasedCache):
+
+    def __init__(self, dir, params):
+        options = params.get('OPTIONS', {})
+        self._persistent = tuple(options.get('PERSISTENT', ()))
+        self._cull_every = options.get(
+            'CULL_EVERY', max(1, options.get('MAX_ENTRIES', 300) // 100))
+        self._sets = itertools.count(1)
+        super().__init__(dir, params)
+
+    def _is_persistent(self, key):
+        return key.startswith(self._persistent) or key.endswith(
+            LOCK_KEY.format(''))
+
+    def _key_to_file(self, key, version=None):
+        fname = super()._key_to_file(key, version)
+        if self._is_persistent(key):
+            return os.path.join(
+                self._dir, PERSISTENT_DIR, os.path.basename(fname))
+        return fname
+
+    def _createdir(self):
+        super()._createdir()
+        os.makedirs(os.path.join(self._dir, PERSISTENT_DIR), 0o700,
+                    exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """Блокировка всего каталога, общая для процессов машины."""
+        self._createdir()
+        with open(os.path.join(self._dir, LOCK_FILE), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked():
+            return super().incr(key, delta, version)
+
+    def _cull(self):
+        # Между проверками число файлов может превысить MAX_ENTRIES
+        # не больше чем на CULL_EVERY записей каждого процесса.
+        if next(self._sets) % self._cull_every == 0:
+            super()._cull()
+
+    def clear(self):
+        super().clear()
+        directory = os.path.join(self._dir, PERSISTENT_DIR)
+        if os.path.isdir(directory):
+            for fname in os.listdir(directory):
+                self._delete(os.path.join(directory, fname))
@@ -0,0 +1,80 @@
+"""Сбор метрик текущего запроса.
+
+PerformanceMiddleware кладет RequestMetrics в contextvar, а запросы
+к базе, кеш и шаблоны дописывают в него свои числа. Шаблоны
+подключаются через бэкенд из этого модуля в TEMPLATES, кеш —
+через core.tiered_cache.InstrumentedTieredCache с InstrumentedCacheMixin.
+"""
+import time
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+current = ContextVar('request_metrics', default=None)
+
+_MISSING = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        # Попадания и промахи по уровням core.tiered_cache.
+        self.cache_tiers = {}
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_queries += 1
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи get и get_many."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        metrics = current.get()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        metrics = current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics = current.get()
+            if metrics is not None:
+                metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, которые засекают время рендера шаблонов."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,97 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import nplusone
+from .instrumentation import RequestMetrics, current
+
+logger = logging.getLogger('yatube.performance')
+
+
+class PerformanceMiddleware:
+    """Метрики каждого запроса: база, кеш, шаблоны и общее время.
+
+    Пишет их строкой JSON в лог yatube.performance и, если включен
+    PERFORMANCE_SERVER_TIMING, в заголовок Server-Timing. Запросы
+    сверх PERFORMANCE_QUERY_BUDGET или PERFORMANCE_LATENCY_BUDGET_MS
+    попадают в лог с уровнем WARNING, как и запросы с N+1
+    (см. core.nplusone); при NPLUSONE_RAISE N+1 — исключение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        started = time.perf_counter()
+        detector = None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.query_wrapper))
+                if nplusone.threshold() is not None:
+                    detector = stack.enter_context(nplusone.detect())
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = time.perf_counter() - started
+        problems = detector.problems() if detector is not None else []
+        if problems and getattr(settings, 'NPLUSONE_RAISE', False):
+            raise nplusone.NPlusOneError(detector.report())
+
+        over_budget = self.over_budget(metrics, total)
+        if getattr(settings, 'PERFORMANCE_SERVER_TIMING', False):
+            response['Server-Timing'] = self.server_timing(
+                metrics, total, over_budget)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'cache_tiers': metrics.cache_tiers,
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'over_budget': over_budget,
+            'nplusone': problems,
+        }
+        logger.log(
+            logging.WARNING if over_budget or problems else logging.INFO,
+            json.dumps(fields, ensure_ascii=False),
+            extra={'performance': fields},
+        )
+        return response
+
+    def over_budget(self, metrics, total):
+        exceeded = []
+        query_budget = getattr(settings, 'PERFORMANCE_QUERY_BUDGET', None)
+        if query_budget is not None and metrics.db_queries > query_budget:
+            exceeded.append('queries')
+        latency_budget = getattr(
+            settings, 'PERFORMANCE_LATENCY_BUDGET_MS', None)
+        if latency_budget is not None and total * 1000 > latency_budget:
+            exceeded.append('latency')
+        return exceeded
+
+    def server_timing(self, metrics, total, over_budget):
+        entries = [
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.db_queries} queries"',
+            f'cache;desc="{metrics.cache_hits} hits, '
+            f'{metrics.cache_misses} misses"',
+            *(f'{tier};desc="{hits} hits, {misses} misses"'
+              for tier, (hits, misses) in sorted(metrics.cache_tiers.items())),
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if over_budget:
+            entries.append(f'budget;desc="{", ".join(over_budget)}"')
+        return ', '.join(entries)
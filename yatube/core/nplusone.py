@@ -0,0 +1,106 @@
+"""Поиск N+1: одинаковых по структуре запросов в одном запросе к сайту.
+
+Django передает SQL в execute_wrapper с плейсхолдерами отдельно
+от параметров, поэтому структура запроса — это сам SQL с одной
+поправкой: списки IN (%s, %s, ...) разной длины считаются одним.
+Для каждой группы повторов запоминается, откуда пришел первый
+запрос: строка шаблона, если запрос сделан при рендере, и строка
+кода проекта.
+"""
+import os
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PLACEHOLDERS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+SAVEPOINT = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO)')
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def threshold():
+    return getattr(settings, 'NPLUSONE_THRESHOLD', 5)
+
+
+def fingerprint(sql):
+    return PLACEHOLDERS.sub('(%s...)', sql)
+
+
+def _origin():
+    """Строка шаблона и строка кода проекта, сделавшие запрос."""
+    template = code = None
+    frame = sys._getframe(1)
+    project = str(settings.BASE_DIR)
+    while frame is not None and (template is None or code is None):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                template = f'{name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code is None and filename.startswith(project)
+                and filename != __file__):
+            code = (f'{os.path.relpath(filename, project)}:'
+                    f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return template, code
+
+
+class Detector:
+    """Обертка execute_wrapper, которая группирует одинаковые запросы."""
+
+    def __init__(self, limit=None):
+        self.limit = threshold() if limit is None else limit
+        self.groups = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and not SAVEPOINT.match(sql):
+            key = fingerprint(sql)
+            group = self.groups.get(key)
+            if group is None:
+                template, code = _origin()
+                self.groups[key] = group = {
+                    'sql': key, 'count': 0,
+                    'template': template, 'code': code,
+                }
+            group['count'] += 1
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        return [group for group in self.groups.values()
+                if group['count'] >= self.limit]
+
+    def report(self):
+        lines = []
+        for group in self.problems():
+            where = ', '.join(filter(None, (group['template'], group['code'])))
+            lines.append(f'{group["count"]} x {group["sql"]}\n    {where}')
+        return 'Похоже на N+1:\n' + '\n'.join(lines)
+
+
+@contextmanager
+def detect(limit=None):
+    """Ловит повторы запросов во всех базах внутри блока."""
+    detector = Detector(limit)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+
+
+class NPlusOneTestMixin:
+    """assertNoNPlusOne для TestCase."""
+
+    @contextmanager
+    def assertNoNPlusOne(self, limit=None):
+        with detect(limit) as detector:
+            yield detector
+        if detector.problems():
+            raise NPlusOneError(detector.report())
@@ -0,0 +1,72 @@
+"""Окружение тестов: файловые кеши во временном каталоге, тихие логи.
+
+Иначе тесты читали бы и писали общий кеш работающего сайта,
+cache.clear() каждого теста стирал бы его версии данных, а два
+одновременных прогона мешали бы друг другу. Метрики каждого запроса
+из core.middleware засоряли бы вывод тестов. manage.py test берет
+IsolatedCacheRunner из TEST_RUNNER, pytest — фикстуру из conftest.py.
+"""
+import logging
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+FILE_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'core.file_cache.LockingFileBasedCache',
+)
+QUIET_LOGGERS = ('yatube.performance',)
+
+
+@contextmanager
+def isolated_caches():
+    """CACHES, в которых файловые кеши лежат в своем временном каталоге."""
+    directory = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    caches = {
+        alias: {**config, 'LOCATION': f'{directory}/{alias}'}
+        if config['BACKEND'] in FILE_BACKENDS else config
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def quiet_logging():
+    """Логгеры QUIET_LOGGERS без вывода; assertLogs их по-прежнему ловит."""
+    saved = {}
+    for name in QUIET_LOGGERS:
+        logger = logging.getLogger(name)
+        saved[name] = logger.handlers, logger.propagate
+        logger.handlers, logger.propagate = [logging.NullHandler()], False
+    try:
+        yield
+    finally:
+        for name, (handlers, propagate) in saved.items():
+            logger = logging.getLogger(name)
+            logger.handlers, logger.propagate = handlers, propagate
+
+
+@contextmanager
+def isolated_environment():
+    with isolated_caches(), quiet_logging():
+        yield
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = isolated_environment()
+        self._environment.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,169 @@
+"""Двухуровневый кеш: локальный LRU перед общим для всех воркеров.
+
+L1 — LocMemCache процесса с коротким LOCAL_TIMEOUT, L2 — кеш
+из CACHES под именем SHARED. Запись идет в оба уровня, add и incr —
+только в L2: блокировки и счетчики должны быть общими, поэтому L2
+обязан выполнять их атомарно. Redis и Memcached это умеют, из файловых
+подходит только core.file_cache.LockingFileBasedCache (и он общий лишь
+для процессов одной машины), FileBasedCache из Django — нет.
+Ключи с префиксами из LOCAL_EXCLUDE (версии данных) в L1
+не попадают никогда, поэтому сброс версии виден всем воркерам
+сразу, а страницы из L1 с прежней версией просто не проходят проверку.
+
+    'default': {
+        'BACKEND': 'core.tiered_cache.TieredCache',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 2},
+    }
+"""
+from threading import Lock
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .instrumentation import InstrumentedCacheMixin, current
+
+_MISSING = object()
+
+# Счетчики процесса: {имя L1: {'l1': [попадания, промахи], 'l2': [...]}}.
+_stats = {}
+_stats_lock = Lock()
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        self.local_exclude = tuple(options.get('LOCAL_EXCLUDE', ()))
+        self._name = f'tiered:{name}'
+        self.local = LocMemCache(self._name, {
+            'TIMEOUT': self.local_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get(
+                'LOCAL_MAX_ENTRIES', 1000)},
+        })
+        with _stats_lock:
+            _stats.setdefault(self._name, {'l1': [0, 0], 'l2': [0, 0]})
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return not key.startswith(self.local_exclude)
+
+    def _local_timeout(self, timeout):
+        """Срок в L1: не дольше LOCAL_TIMEOUT и не дольше, чем в L2."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return max(0, min(timeout, self.local_timeout))
+
+    def _count(self, tier, hits, misses):
+        with _stats_lock:
+            counters = _stats[self._name][tier]
+            counters[0] += hits
+            counters[1] += misses
+        metrics = current.get()
+        if metrics is not None:
+            tiers = metrics.cache_tiers.setdefault(tier, [0, 0])
+            tiers[0] += hits
+            tiers[1] += misses
+
+    def stats(self):
+        """Попадания, промахи и доля попаданий каждого уровня в процессе."""
+        with _stats_lock:
+            counters = {tier: list(values)
+                        for tier, values in _stats[self._name].items()}
+        return {
+            tier: {'hits': hits, 'misses': misses,
+                   'ratio': hits / (hits + misses) if hits + misses else 0.0}
+            for tier, (hits, misses) in counters.items()
+        }
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            value = self.local.get(key, _MISSING, version=version)
+            self._count('l1', value is not _MISSING, value is _MISSING)
+            if value is not _MISSING:
+                return value
+        return self.get_shared(key, default, version=version)
+
+    def get_shared(self, key, default=None, version=None):
+        """Значение прямо из L2 (с обновлением L1), минуя локальную копию."""
+        value = self.shared.get(key, _MISSING, version=version)
+        self._count('l2', value is not _MISSING, value is _MISSING)
+        if value is _MISSING:
+            return default
+        if self._is_local(key):
+            self.local.set(key, value, self.local_timeout, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        local_keys = [key for key in keys if self._is_local(key)]
+        found = self.local.get_many(local_keys, version=version)
+        self._count('l1', len(found), len(local_keys) - len(found))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            self._count('l2', len(shared), len(missing) - len(shared))
+            self.local.set_many(
+                {key: value for key, value in shared.items()
+                 if self._is_local(key)},
+                self.local_timeout, version=version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self.local.set(
+                key, value, self._local_timeout(timeout), version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.local.set_many(
+            {key: value for key, value in data.items()
+             if self._is_local(key) and key not in failed},
+            self._local_timeout(timeout), version=version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.add(key, value, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.local.delete(key, version=version)
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return (self._is_local(key) and self.local.has_key(
+            key, version=version)) or self.shared.has_key(
+                key, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version=version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class InstrumentedTieredCache(InstrumentedCacheMixin, TieredCache):
+    pass
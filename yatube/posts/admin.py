@@ -1,20 +1,43 @@
 from django.contrib import admin
+from django.db import connection
 
 # Register your models here.
+from . import search
 from .models import Post, Group, Comment
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск в админке через индекс posts.search вместо LIKE '%q%'."""
+
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        found = search.matching_sql(self.search_kind, search_term)
+        if found is None:
+            return super().get_search_results(
+                request, queryset, search_term)
+        # pk__in=RawSQL(...) дает IN ((SELECT ...)), а SQLite считает
+        # такой подзапрос скалярным и берет из него одну строку.
+        sql, params = found
+        pk = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column))
+        return queryset.extra(where=[f'{pk} IN ({sql})'], params=params), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     search_fields = ('text',)
+    search_kind = search.POST
     list_filter = ('pub_date',)
     list_editable = ('group',)
     empty_value_display = ('-пусто-')
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author')
     search_fields = ('text',)
+    search_kind = search.COMMENT
     list_filter = ('created', 'author',)
     # list_editable = ('group',)
     empty_value_display = ('-пусто-')
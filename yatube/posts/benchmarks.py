@@ -0,0 +1,196 @@
+"""Общие помощники бенчмарков: временная база и наполнение данными."""
+import io
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import thumbnails
+from .models import Comment, Follow, Group, Post, UserStats
+from .storage import image_storage
+from .utils import explicit_dates
+
+User = get_user_model()
+
+
+@contextmanager
+def private_caches():
+    """Кеши в памяти процесса вместо общих из CACHES.
+
+    measure чистит кеш перед прогонами, а записи поднимают версии:
+    на общем кеше это сбросило бы страницы работающего сайта.
+    Двухуровневые кеши остаются, но со своим L1 (его имя берется
+    из LOCATION) и с L2 из подмененного SHARED.
+    """
+    private = {
+        alias: {**config, 'LOCATION': f'benchmark:{alias}'}
+        if 'SHARED' in config.get('OPTIONS', {}) else {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'benchmark:{alias}',
+            'TIMEOUT': config.get('TIMEOUT', 300),
+        }
+        for alias, config in settings.CACHES.items()
+    }
+    with override_settings(CACHES=private):
+        yield
+
+
+@contextmanager
+def temporary_database():
+    """Отдельная тестовая база с миграциями; рабочая не затрагивается."""
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed(users=100, groups=10, posts=10000, comments=20000, follows=2000,
+         images=0, days=365, seed=0, batch_size=None):
+    """Наполняет базу правдоподобными данными, минуя сигналы.
+
+    images постов получают разные картинки с готовыми миниатюрами
+    и вариантами — как после фоновой подготовки.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    span = int(timedelta(days=days).total_seconds())
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(span))
+
+    User.objects.bulk_create(
+        [User(username=f'user{i}', first_name=f'Имя{i}',
+              last_name=f'Фамилия{i}') for i in range(users)],
+        batch_size=batch_size)
+    Group.objects.bulk_create(
+        [Group(title=f'Группа {i}', slug=f'group-{i}',
+               description=f'Описание {i}') for i in range(groups)],
+        batch_size=batch_size)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True)) + [None]
+
+    with explicit_dates(Post._meta.get_field('pub_date'),
+                        Comment._meta.get_field('created')):
+        Post.objects.bulk_create(
+            [Post(author_id=rng.choice(user_ids),
+                  group_id=rng.choice(group_ids),
+                  text=f'Текст поста {i}', pub_date=moment())
+             for i in range(posts)],
+            batch_size=batch_size)
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        Comment.objects.bulk_create(
+            [Comment(post_id=rng.choice(post_ids),
+                     author_id=rng.choice(user_ids),
+                     text=f'Комментарий {i}', created=moment())
+             for i in range(comments if post_ids else 0)],
+            batch_size=batch_size)
+
+    pairs = {(rng.choice(user_ids), rng.choice(user_ids))
+             for _ in range(follows)}
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in pairs if user_id != author_id],
+        batch_size=batch_size)
+    UserStats.objects.rebuild()
+    seed_images(images, rng)
+
+
+def seed_images(count, rng):
+    """Раздает count случайным постам разные картинки."""
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    for post_id in rng.sample(post_ids, min(count, len(post_ids))):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1200, 800), color).save(buffer, format='JPEG')
+        name = image_storage.save(
+            f'posts/seed-{post_id}.jpg', ContentFile(buffer.getvalue()))
+        Post.objects.filter(pk=post_id).update(image=name)
+        thumbnails.render_thumbnails(name)
+
+
+def timed(func, repeat):
+    """Времена выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def percentile(timings, share):
+    """Перцентиль отсортированного списка времен."""
+    if not timings:
+        return 0.0
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def measure(request, repeat, warm=False):
+    """Задержки, запросы к базе и пик памяти одного запроса к view.
+
+    request() выполняет запрос и возвращает ответ. Без warm кеш
+    чистится перед каждым повтором, и меряется работа самого view.
+    Память меряется отдельным прогоном: tracemalloc искажает время.
+    """
+    statuses = set()
+    queries = []
+
+    def run():
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            statuses.add(request().status_code)
+        queries.append(len(context.captured_queries))
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    if not warm:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        request()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else 0.0,
+        'max_ms': round(timings[-1], 3) if timings else 0.0,
+        'queries': sorted(queries)[len(queries) // 2] if queries else 0,
+        'peak_kb': round(peak / 1024, 1),
+        'status': sorted(statuses),
+    }
+
+
+def compare(old, new, keys=('p50_ms', 'p95_ms', 'queries', 'peak_kb')):
+    """Разница двух отчетов: {view: {метрика: (было, стало, %)}}."""
+    diff = {}
+    for name, metrics in new.get('views', {}).items():
+        before = old.get('views', {}).get(name)
+        if before is None:
+            continue
+        diff[name] = {}
+        for key in keys:
+            was, now = before.get(key, 0), metrics.get(key, 0)
+            change = (now - was) / was * 100 if was else 0.0
+            diff[name][key] = (was, now, round(change, 1))
+    return diff
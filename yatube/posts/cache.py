@@ -0,0 +1,189 @@
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.cache import get_or_compute
+
+from .models import Post
+
+VERSION_KEY = 'posts:version:{}'
+PAGE_KEY = 'posts:page:{}:{}:{}'
+
+
+def _fresh_version():
+    # Версия из текущего времени, а не с единицы: если ключ версии
+    # вытеснят из кеша, старые страницы не оживут под тем же номером.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Текущая версия данных, от которых зависят страницы name."""
+    return get_versions(name)[0]
+
+
+def get_versions(*names):
+    """Версии нескольких зависимостей одним обращением к кешу."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            version = _fresh_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            found[key] = version
+    return tuple(found[key] for key in keys)
+
+
+def bump_version(*names):
+    """Сбрасывает кеш страниц: они уйдут под новую версию.
+
+    Новая версия не меньше текущего времени в миллисекундах,
+    поэтому по версиям можно судить о времени изменения.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    current = cache.get_many(keys)
+    now = _fresh_version()
+    for key in keys:
+        try:
+            cache.incr(key, max(1, now - current.get(key, now)))
+        except ValueError:
+            # Первую версию мог одновременно создать другой воркер.
+            if not cache.add(key, now, None):
+                cache.incr(key)
+
+
+# Зависимости лент. Каждая функция получает аргументы view
+# и возвращает имена версий, смена любой из которых сбрасывает страницу.
+# groups — правки групп, видимые во всех лентах; user:<зритель> —
+# имя зрителя в шапке страницы. Смена имени автора сбрасывает
+# версии его страниц (см. posts.signals.author_changed).
+INDEX_FEED = ('posts', 'groups')
+
+
+def _viewer(request):
+    return request.user.pk if request.user.is_authenticated else 'anon'
+
+
+def _viewer_version(request):
+    return f'user:{_viewer(request)}'
+
+
+def index_versions(request):
+    return (*INDEX_FEED, _viewer_version(request))
+
+
+def group_versions(request, slug):
+    return (f'group:{slug}', 'groups', _viewer_version(request))
+
+
+def profile_versions(request, username):
+    # follows: флаг «подписан» зависит от подписок зрителя.
+    # suggestions: блок «кого почитать» для зрителя.
+    return (f'author:{username}', f'follows:{_viewer(request)}',
+            'groups', _viewer_version(request), 'suggestions')
+
+
+def follow_versions(user_id, author_ids):
+    # Только выбор постов ленты (см. posts.utils.paginate_ids):
+    # follow_feed — подписки читателя, author_feed — посты,
+    # появившиеся у его авторов или исчезнувшие.
+    return (f'follow_feed:{user_id}',
+            *(f'author_feed:{author_id}' for author_id in sorted(author_ids)))
+
+
+def comment_versions(post_id):
+    return (f'comments:{post_id}',)
+
+
+def post_versions(post_id, username):
+    # author: на странице поста выводится число постов автора.
+    return (f'post:{post_id}', f'author:{username}', 'groups')
+
+
+def detail_versions(post_id, username):
+    return post_versions(post_id, username) + comment_versions(post_id)
+
+
+def _detail_versions(request, post_id):
+    """Версии страницы поста; один запрос к базе за имя автора."""
+    if not hasattr(request, '_detail_versions'):
+        username = Post.objects.filter(pk=post_id).values_list(
+            'author__username', flat=True).first()
+        request._detail_versions = None if username is None else (
+            get_versions(*detail_versions(post_id, username),
+                         _viewer_version(request)))
+    return request._detail_versions
+
+
+def detail_etag(request, post_id):
+    """ETag страницы поста: версии ее данных, зритель и CSRF-токен.
+
+    Пользователь видит форму комментария с CSRF-токеном, а токен
+    меняется при входе: без него 304 после повторного входа оставил бы
+    в браузере форму со старым токеном. Без CSRF-cookie страница
+    получит новый токен, поэтому ETag не выдается.
+    """
+    versions = _detail_versions(request, post_id)
+    csrf = None
+    if request.user.is_authenticated:
+        csrf = request.META.get('CSRF_COOKIE')
+        if csrf is None:
+            return None
+    if versions is None:
+        return None
+    return hashlib.md5(
+        repr((_viewer(request), versions, csrf)).encode()).hexdigest()
+
+
+def detail_last_modified(request, post_id):
+    """Last-Modified по самой свежей версии (см. bump_version).
+
+    Только для гостей: у пользователя страница зависит еще
+    и от CSRF-токена, которого дата не отражает (см. detail_etag).
+    """
+    versions = _detail_versions(request, post_id)
+    if versions is None or request.user.is_authenticated:
+        return None
+    return datetime.fromtimestamp(max(versions) / 1000, tz=timezone.utc)
+
+
+def page_key(request, name):
+    """Ключ страницы: адрес и вариант для пользователя."""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(name, _viewer(request), path)
+
+
+def cache_feed(versions, timeout=None):
+    """Замена cache_page: страница живет в кеше до смены версий.
+
+    versions(request, *args, **kwargs) называет зависимости страницы.
+    Пересчет защищен от наплыва (см. core.cache.get_or_compute);
+    timeout, если задан, включает вероятностное раннее обновление.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            rendered = []
+
+            def render():
+                response = view(request, *args, **kwargs)
+                rendered.append(response)
+                if response.status_code == 200 and not response.streaming:
+                    return response
+                return None
+
+            response = get_or_compute(
+                page_key(request, view.__name__),
+                render,
+                version=get_versions(*versions(request, *args, **kwargs)),
+                timeout=timeout,
+            )
+            return response if response is not None else rendered[-1]
+        return wrapper
+    return decorator
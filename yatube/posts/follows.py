@@ -0,0 +1,73 @@
+"""Подписки: одиночные и пачкой, один запрос на запись.
+
+Вставка — bulk_create(ignore_conflicts=True): повторы отсекает
+ограничение user_author; удаление — QuerySet.delete(), один DELETE.
+bulk_create сигналов не шлет, а delete шлет post_delete на каждую
+подписку; обработчики Follow в posts.signals пропускают подписки
+внутри signals.follows_in_bulk(). Счетчики, ленту и версии кеша
+для всей пачки разом обновляет _changed, версии — после коммита.
+
+following_ids — множество id авторов, на которых подписан
+пользователь; оно живет в кеше до смены версии follows:<id>.
+"""
+from django.db import transaction
+
+from core.cache import get_or_compute
+
+from . import signals, timeline
+from .cache import bump_version, get_version
+from .models import Follow, UserStats
+
+FOLLOWING_KEY = 'posts:following:{}'
+
+
+def following_ids(user_id):
+    """id авторов, на которых подписан user_id."""
+    return get_or_compute(
+        FOLLOWING_KEY.format(user_id),
+        lambda: frozenset(Follow.objects.filter(
+            user_id=user_id).values_list('author_id', flat=True)),
+        version=get_version(f'follows:{user_id}'),
+    )
+
+
+def is_following(user, author_id):
+    return user.is_authenticated and author_id in following_ids(user.pk)
+
+
+def follow(user, author_ids):
+    """Подписывает user на авторов; возвращает id новых подписок."""
+    added = set(author_ids) - {user.pk} - following_ids(user.pk)
+    if added:
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                [Follow(user=user, author_id=author_id)
+                 for author_id in added],
+                ignore_conflicts=True,
+            )
+            _changed(user.pk, added)
+        if timeline.is_enabled():
+            for author_id in added:
+                timeline.backfill(user.pk, author_id)
+    return added
+
+
+def unfollow(user, author_ids):
+    """Отписывает user от авторов; возвращает id снятых подписок."""
+    removed = set(author_ids) & following_ids(user.pk)
+    if removed:
+        with transaction.atomic(), signals.follows_in_bulk():
+            Follow.objects.filter(user=user, author_id__in=removed).delete()
+            _changed(user.pk, removed)
+        if timeline.is_enabled():
+            for author_id in removed:
+                timeline.prune(user.pk, author_id)
+    return removed
+
+
+def _changed(user_id, author_ids):
+    UserStats.objects.refresh_follows({user_id, *author_ids})
+    # До коммита другой запрос пересчитал бы кеш по старым подпискам
+    # и сохранил его под новой версией.
+    transaction.on_commit(lambda: bump_version(
+        f'follows:{user_id}', f'follow_feed:{user_id}'))
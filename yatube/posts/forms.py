@@ -1,4 +1,6 @@
 from django import forms
+
+from . import uploads
 from .models import Post, Comment
 
 
@@ -15,6 +17,31 @@ class PostForm(forms.ModelForm):
         #     'group': 'Группу можно не выбирать, ну а все же?'
         # }
 
+    def clean_image(self):
+        """Проверяет картинку по заголовку и уменьшает большие оригиналы.
+
+        Загрузки лежат во временных файлах (см. FILE_UPLOAD_HANDLERS),
+        так что ImageField проверяет их с диска, не читая в память.
+        """
+        image = self.cleaned_data['image']
+        if not image or not hasattr(image, 'content_type'):
+            return image
+        try:
+            opened = uploads.inspect(image)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc), code='invalid_image')
+        with opened:
+            return uploads.downsize(image, opened)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Недокачанный файл ImageField считает битым:
+        # показываем настоящую причину.
+        if isinstance(self.files.get('image'), uploads.RejectedUpload):
+            self.errors.pop('image', None)
+            self.add_error('image', uploads.too_large_message())
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.benchmarks import percentile, seed, temporary_database, timed
+from posts.models import Comment, Group, Post
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время запросов лент с составными '
+            'индексами и без них на временной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def queries(self):
+        author = Post.objects.values_list('author_id', flat=True).first()
+        group = Group.objects.values_list('pk', flat=True).first()
+        post = Comment.objects.values_list('post_id', flat=True).first()
+        return {
+            'index': Post.objects.for_feed()[:10],
+            'index, страница 100': Post.objects.for_feed()[990:1000],
+            'group_posts': Post.objects.filter(group_id=group).for_feed()[:10],
+            'profile': Post.objects.filter(author_id=author).for_feed()[:10],
+            'курсор': Post.objects.order_by('-pub_date', '-pk')[:11],
+            'комментарии': Comment.objects.filter(
+                post_id=post).select_related('author')[:50],
+        }
+
+    def measure(self, repeat):
+        results = {}
+        for name, queryset in self.queries().items():
+            timings = timed(lambda: list(queryset.all()), repeat)
+            results[name] = {
+                'plan': queryset.explain(),
+                'p50': percentile(timings, 0.5),
+                'p95': percentile(timings, 0.95),
+            }
+        return results
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            seed(users=options['users'], groups=options['groups'],
+                 posts=options['posts'], comments=options['comments'])
+            after = self.measure(options['repeat'])
+            self.drop_indexes()
+            before = self.measure(options['repeat'])
+
+        for name in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, result in (('без индексов', before[name]),
+                                  ('с индексами', after[name])):
+                self.stdout.write(
+                    f'  {label}: p50 {result["p50"]:.2f} мс, '
+                    f'p95 {result["p95"]:.2f} мс')
+                for line in result['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,140 @@
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.benchmarks import (
+    compare, measure, private_caches, seed, temporary_database)
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон горячих view на временной базе: '
+            'перцентили задержек, число запросов и пик памяти '
+            'в JSON-отчете, который можно сравнить с прошлым.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=4000)
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не чистить кеш между повторами.')
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для JSON-отчета; «-» — стандартный вывод.')
+        parser.add_argument(
+            '--compare', metavar='REPORT',
+            help='Прошлый отчет, с которым сравнить результаты.')
+
+    def scenarios(self):
+        """Запросы к view на самых «тяжелых» объектах набора."""
+        author = User.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        reader = User.objects.annotate(
+            total=Count('follower')).order_by('-total').first()
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        post = Post.objects.annotate(
+            total=Count('comments')).order_by('-total').first()
+        if None in (author, reader, group, post):
+            raise CommandError('Набор данных пуст: увеличьте --posts.')
+
+        guest, client = Client(), Client()
+        client.force_login(reader)
+        return {
+            'index': lambda: guest.get(reverse('posts:index')),
+            'group_posts': lambda: guest.get(
+                reverse('posts:group_list', args=[group.slug])),
+            'profile': lambda: guest.get(
+                reverse('posts:profile', args=[author.username])),
+            'post_detail': lambda: guest.get(
+                reverse('posts:post_detail', args=[post.pk])),
+            'follow_index': lambda: client.get(
+                reverse('posts:follow_index')),
+            'add_comment': lambda: client.post(
+                reverse('posts:add_comment', args=[post.pk]),
+                {'text': 'Комментарий из бенчмарка'}),
+            'post_create': lambda: client.post(
+                reverse('posts:post_create'),
+                {'text': 'Пост из бенчмарка', 'group': group.pk}),
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run(self, options):
+        dataset = {name: options[name] for name in (
+            'users', 'groups', 'posts', 'comments', 'follows', 'images')}
+        with temporary_database():
+            seed(seed=options['seed'], **dataset)
+            views = {
+                name: measure(request, options['repeat'], options['warm'])
+                for name, request in self.scenarios().items()
+            }
+            database = connection.vendor
+        return {
+            'meta': {
+                'commit': self.commit(),
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': database,
+                'dataset': dataset,
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+            },
+            'views': views,
+        }
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                POSTS_THUMBNAIL_WORKERS=0,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ), private_caches():
+                report = self.run(options)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(text)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                out.write(text + '\n')
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                old = json.load(source)
+            for name, metrics in compare(old, report).items():
+                self.stderr.write(self.style.MIGRATE_HEADING(name))
+                for key, (was, now, change) in metrics.items():
+                    self.stderr.write(
+                        f'  {key}: {was} -> {now} ({change:+.1f}%)')
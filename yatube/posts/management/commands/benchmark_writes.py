@@ -0,0 +1,197 @@
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from posts.benchmarks import (
+    percentile, private_caches, seed, temporary_database)
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+# Настройки SQLite «из коробки»: журнал отката и fsync на каждый коммит.
+ROLLBACK_PROFILE = {
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {
+        'transaction_mode': 'DEFERRED',
+        'pragmas': {'journal_mode': 'delete', 'synchronous': 'full'},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность записи (посты, комментарии, подписки) '
+            'из нескольких потоков на временной базе: SQLite с журналом '
+            'отката против профиля из DATABASES.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--writes', type=int, default=200,
+            help='Сколько записей делает каждый поток.')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для JSON-отчета; «-» — стандартный вывод.')
+
+    def profiles(self):
+        configured = settings.DATABASES['default']
+        profiles = {}
+        if connection.vendor == 'sqlite':
+            profiles['rollback'] = ROLLBACK_PROFILE
+        profiles['configured'] = {
+            'CONN_MAX_AGE': configured.get('CONN_MAX_AGE', 0),
+            'OPTIONS': configured.get('OPTIONS', {}),
+        }
+        return profiles
+
+    def writes(self, rng, user_ids, post_ids):
+        """Те же записи, что делают post_create, add_comment и follow."""
+        user = User.objects.get(pk=rng.choice(user_ids))
+
+        def post_create():
+            Post.objects.create(author=user, text='Пост из бенчмарка')
+
+        def add_comment():
+            Comment.objects.create(
+                post_id=rng.choice(post_ids), author=user,
+                text='Комментарий из бенчмарка')
+
+        def profile_follow():
+            author_id = rng.choice(user_ids)
+            with transaction.atomic():
+                follow = Follow.objects.filter(
+                    user=user, author_id=author_id).first()
+                if follow is not None:
+                    follow.delete()
+                elif author_id != user.pk:
+                    Follow.objects.create(user=user, author_id=author_id)
+
+        return [post_create, add_comment, profile_follow]
+
+    def worker(self, number, options, user_ids, post_ids, results):
+        rng = random.Random(options['seed'] + number)
+        timings = {}
+        errors = 0
+        try:
+            writes = self.writes(rng, user_ids, post_ids)
+            for _ in range(options['writes']):
+                write = rng.choice(writes)
+                started = time.perf_counter()
+                try:
+                    write()
+                except OperationalError:
+                    # «database is locked»: запись не дождалась блокировки
+                    errors += 1
+                    continue
+                timings.setdefault(write.__name__, []).append(
+                    (time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+        results.append((timings, errors))
+
+    def run(self, options):
+        seed(users=options['users'], groups=5, posts=options['posts'],
+             comments=0, follows=0, seed=options['seed'])
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        # Соединение главного потока не должно держать блокировок.
+        connection.close()
+
+        results = []
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                number, options, user_ids, post_ids, results))
+            for number in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        by_view = {}
+        for timings, _ in results:
+            for name, values in timings.items():
+                by_view.setdefault(name, []).extend(values)
+        everything = sorted(value for values in by_view.values()
+                            for value in values)
+        return {
+            'writes_per_sec': round(len(everything) / elapsed, 1),
+            'writes': len(everything),
+            'errors': sum(errors for _, errors in results),
+            'p50_ms': round(percentile(everything, 0.5), 3),
+            'p95_ms': round(percentile(everything, 0.95), 3),
+            'p99_ms': round(percentile(everything, 0.99), 3),
+            'views': {
+                name: {
+                    'writes': len(values),
+                    'p95_ms': round(percentile(sorted(values), 0.95), 3),
+                }
+                for name, values in sorted(by_view.items())
+            },
+        }
+
+    def run_profile(self, profile, options):
+        """Прогон на свежей файловой базе с настройками профиля."""
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key)
+                 for key in ('CONN_MAX_AGE', 'OPTIONS', 'TEST')}
+        directory = tempfile.mkdtemp()
+        try:
+            settings_dict.update(profile)
+            if connection.vendor == 'sqlite':
+                # WAL имеет смысл только для файла, не для базы в памяти.
+                settings_dict['TEST'] = {
+                    **(saved['TEST'] or {}),
+                    'NAME': f'{directory}/benchmark.sqlite3',
+                }
+            connection.close()
+            with temporary_database():
+                return self.run(options)
+        finally:
+            settings_dict.update(saved)
+            connection.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        # Записи поднимают версии кеша: общий кеш сайта не трогаем.
+        with private_caches():
+            profiles = {
+                name: self.run_profile(profile, options)
+                for name, profile in self.profiles().items()
+            }
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'threads': options['threads'],
+                'writes': options['writes'],
+            },
+            'profiles': profiles,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(text)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                out.write(text + '\n')
+
+        profiles = report['profiles']
+        if 'rollback' in profiles:
+            was = profiles['rollback']['writes_per_sec']
+            now = profiles['configured']['writes_per_sec']
+            self.stderr.write(
+                f'Записей в секунду: {was} -> {now} '
+                f'({(now - was) / was * 100 if was else 0.0:+.1f}%)')
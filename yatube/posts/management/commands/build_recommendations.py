@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «кого почитать» по графу '
+            'подписок; запускается по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=None,
+            help='Сколько авторов хранить на пользователя '
+                 '(по умолчанию POSTS_SUGGESTIONS).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = recommendations.rebuild(
+            options['top'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций: {total} за {time.monotonic() - started:.1f} с'))
@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import storage
+from posts.models import Post
+
+# Каталог Post.image в хранилище картинок.
+DIRECTORY = 'posts'
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не осталось ссылок: '
+            'те, что collect пропустил из-за COLLECT_GRACE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=storage.COLLECT_GRACE,
+            help='Не трогать файлы моложе стольких секунд.')
+
+    def handle(self, *args, **options):
+        _, files = storage.image_storage.listdir(DIRECTORY)
+        names = []
+        for filename in files:
+            name = f'{DIRECTORY}/{filename}'
+            if name.endswith('.collect'):
+                self.restore(name[:-len('.collect')])
+            else:
+                names.append(name)
+        referenced = set(Post.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        collected = sum(
+            storage.collect(name, grace=options['grace'])
+            for name in names if name not in referenced)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок: {collected}'))
+
+    def restore(self, name):
+        """Файл, брошенный прерванным collect: вернуть или удалить."""
+        path = storage.image_storage.path(name)
+        if Post.objects.filter(image=name).exists() and not os.path.exists(
+                path):
+            os.replace(f'{path}.collect', path)
+        else:
+            os.remove(f'{path}.collect')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import write_behind
+
+
+class Command(BaseCommand):
+    help = ('Переносит комментарии из очереди отложенной записи '
+            'в базу (см. POSTS_COMMENT_WRITE_BEHIND).')
+
+    def handle(self, *args, **options):
+        total = write_behind.drain()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано комментариев из очереди: {total}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заранее нарезает варианты всех картинок постов.'
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True).distinct().iterator()
+        started = time.monotonic()
+        pool = thumbnails.executor()
+        if pool is None:
+            results = map(thumbnails.render_thumbnails, names)
+        else:
+            results = pool.map(thumbnails.render_thumbnails, names,
+                               chunksize=16)
+        images = rendered = 0
+        for done in results:
+            images += 1
+            rendered += done
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок: {images}, вариантов: {rendered}, '
+            f'за {time.monotonic() - started:.1f} с'))
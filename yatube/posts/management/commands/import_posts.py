@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из NDJSON или CSV пачками через bulk_create. '
+            'Поля: author (username), group (slug), text, pub_date, image.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для загрузки; «-» — стандартный ввод.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def report(self, created, throughput):
+        self.stdout.write(
+            f'Создано постов: {created} ({throughput:.0f} в секунду)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        importer = transfer.Importer(
+            batch_size=options['batch_size'], on_batch=self.report)
+        try:
+            if options['path'] == '-':
+                importer.run(transfer.read_rows(sys.stdin, options['format']))
+            else:
+                with open(options['path'], encoding='utf-8',
+                          newline='') as source:
+                    importer.run(
+                        transfer.read_rows(source, options['format']))
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(
+                f'Импорт прерван после {importer.created} постов: {exc}')
+
+        for number, reason in importer.skipped:
+            self.stderr.write(f'Строка {number} пропущена: {reason}')
+        rest = importer.skipped_count - len(importer.skipped)
+        if rest:
+            self.stderr.write(f'...и еще {rest} строк пропущено')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {importer.created}, '
+            f'пропущено строк: {importer.skipped_count}, '
+            f'{importer.throughput():.0f} в секунду'))
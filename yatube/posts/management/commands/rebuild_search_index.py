@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс постов и комментариев заново.'
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stderr.write('Поиск для этой базы данных не поддерживается.')
+            return
+        with transaction.atomic():
+            total = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано записей: {total}'))
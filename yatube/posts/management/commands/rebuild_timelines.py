@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trim',
+            action='store_true',
+            help='Только обрезать ленты до POSTS_TIMELINE_LENGTH.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            follower__isnull=False).distinct().values_list('pk', flat=True)
+        if options['trim']:
+            for user_id in users.iterator():
+                timeline.trim(user_id)
+            self.stdout.write(self.style.SUCCESS('Ленты обрезаны.'))
+            return
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            follows = Follow.objects.values_list('user_id', 'author_id')
+            for user_id, author_id in follows.iterator():
+                timeline.backfill(user_id, author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'))
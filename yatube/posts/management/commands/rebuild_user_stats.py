@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            UserStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {UserStats.objects.count()}'))
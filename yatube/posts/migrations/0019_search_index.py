@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from posts import search
+    backend = search.backend(schema_editor.connection)
+    if backend is None:
+        return
+    schema_editor.execute(backend.create_sql)
+    alias = schema_editor.connection.alias
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    search.index_all(
+        Post.objects.using(alias), Comment.objects.using(alias),
+        conn=schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from posts import search
+    backend = search.backend(schema_editor.connection)
+    if backend is not None:
+        schema_editor.execute(backend.drop_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
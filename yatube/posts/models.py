@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import functions
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 
 User = get_user_model()
 
@@ -20,6 +23,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """Запросы к постам для лент."""
+
+    # Поля, которые реально выводят шаблоны лент.
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'author_id', 'group_id',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__title', 'group__slug',
+    )
+
+    def for_feed(self):
+        """Автор и группа одним JOIN, без лишних колонок."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -49,15 +67,30 @@ class Post(models.Model):
         'Картинка',
         help_text='Загрузите подходящую картинку',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        # Одинаковые файлы хранятся один раз, см. posts.storage;
+        # индекс нужен для подсчета ссылок на файл.
+        storage=image_storage,
+        db_index=True,
     )
     # Аргумент upload_to указывает директорию,
     # в которую будут загружаться пользовательские файлы.
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date', )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы под ленты: фильтр и сортировка по дате одним проходом.
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_date'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_date'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_id'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -85,11 +118,24 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    # Ключ строки очереди posts.write_behind: по нему перенос
+    # узнает, что комментарий уже записан прошлой попыткой.
+    queue_key = models.CharField(
+        max_length=32,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-created', )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -117,3 +163,199 @@ class Follow(models.Model):
                 name='user_author'
             )
         ]
+
+
+class UserStatsManager(models.Manager):
+    def for_user(self, user):
+        """Счетчики пользователя; при отсутствии строки — пересчет."""
+        stats = self.filter(user=user).first()
+        if stats is None:
+            stats, _ = self.get_or_create(
+                user=user, defaults=self.recount(user.pk))
+        return stats
+
+    def recount(self, user_id):
+        """Честный подсчет всех счетчиков одного пользователя."""
+        return {
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'comments_count': Comment.objects.filter(
+                author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        }
+
+    def rebuild(self):
+        """Пересчитывает счетчики всех пользователей."""
+        totals = {}
+        sources = (
+            ('posts_count', Post.objects, 'author'),
+            ('comments_count', Comment.objects, 'author'),
+            ('followers_count', Follow.objects, 'author'),
+            ('following_count', Follow.objects, 'user'),
+        )
+        for name, manager, field in sources:
+            rows = manager.order_by().values(field).annotate(
+                total=models.Count('pk')).values_list(field, 'total')
+            for user_id, total in rows:
+                totals.setdefault(user_id, {})[name] = total
+        self.all().delete()
+        self.bulk_create(
+            [self.model(user_id=user_id, **totals.get(user_id, {}))
+             for user_id in User.objects.values_list('pk', flat=True)],
+            batch_size=1000,
+        )
+
+    def refresh_follows(self, user_ids):
+        """Честные счетчики подписок нескольких пользователей одним UPDATE."""
+        def total(field):
+            return functions.Coalesce(models.Subquery(
+                Follow.objects.filter(**{field: models.OuterRef('user_id')})
+                .order_by().values(field)
+                .annotate(total=models.Count('pk')).values('total'),
+                output_field=models.IntegerField()), 0)
+
+        self.filter(user_id__in=user_ids).update(
+            followers_count=total('author_id'),
+            following_count=total('user_id'),
+        )
+
+    def increment(self, user_id, field, delta):
+        """Сдвигает счетчик; пропавшую строку пересоздаст for_user."""
+        self.filter(user_id=user_id).update(
+            **{field: models.F(field) + delta})
+
+
+class UserStats(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Обновляются сигналами на создание и удаление Post, Comment
+    и Follow, пересчитываются командой rebuild_user_stats.
+    """
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return f'Счетчики {self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя.
+
+    Заполняется при публикации (fan-out on write), см. posts.timeline.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date: лента сортируется без JOIN с постами.
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_date'),
+        ]
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста для srcset, см. posts.variants.
+
+    Имя файла содержит хеш содержимого оригинала, поэтому одинаковые
+    картинки делят одни и те же варианты.
+    """
+    source = models.CharField('Оригинал', max_length=255, db_index=True)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    format = models.CharField('Формат', max_length=10)
+    image = models.ImageField('Файл', max_length=255)
+
+    class Meta:
+        ordering = ('width', )
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'width', 'format'],
+                name='variant_source_width_format'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.source} {self.width}w {self.format}'
+
+
+class Suggestion(models.Model):
+    """Автор, на которого стоит подписаться пользователю.
+
+    Пересобирается целиком по графу подписок, см. posts.recommendations.
+    """
+    FRIENDS = 'friends'
+    COFOLLOW = 'cofollow'
+    POPULAR = 'popular'
+    REASONS = (
+        (FRIENDS, 'Его читают те, на кого вы подписаны'),
+        (COFOLLOW, 'Его читают вместе с вашими авторами'),
+        (POPULAR, 'Популярный автор'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='suggestions'
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='suggested_to'
+    )
+    score = models.FloatField('Оценка')
+    reason = models.CharField('Причина', max_length=10, choices=REASONS)
+
+    class Meta:
+        ordering = ('-score', )
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='suggestion_user_author'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score'),
+        ]
@@ -0,0 +1,141 @@
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Соль для подписи курсоров: токен непрозрачен для клиента
+# и не может быть подделан вручную.
+CURSOR_SALT = 'posts.cursor'
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(obj, direction, field='pub_date'):
+    """Упаковывает ключ (field, id) объекта в непрозрачный токен."""
+    return signing.dumps(
+        [direction, getattr(obj, field).isoformat(), obj.pk],
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        direction, moment, pk = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    moment = parse_datetime(moment)
+    if direction not in (NEXT, PREVIOUS) or moment is None:
+        return None
+    return direction, moment, pk
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации.
+
+    Номер страницы неизвестен: вместо него страница хранит токены
+    соседних страниц и признак is_first. Страница за концом ленты
+    пуста, но первой не считается — из нее можно вернуться в начало.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None, is_first=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.is_first = (
+            previous_cursor is None if is_first is None else is_first)
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (field, id) без COUNT(*) и OFFSET.
+
+    Страницы идут по убыванию field — даты публикации поста
+    или, например, created у комментариев.
+    Каждая страница — один запрос на per_page + 1 строк.
+    count и num_pages, как у Paginator, считаются COUNT(*) только
+    при обращении; сами страницы их не используют.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, field='pub_date', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.field = field
+
+    @property
+    def page_range(self):
+        # Номера страниц не переводятся в курсоры.
+        return range(0)
+
+    def validate_number(self, number):
+        return number
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def rows(self, decoded, limit):
+        """limit строк после (или до) позиции из токена в порядке обхода.
+
+        object_list, который не QuerySet, может отдавать их сам
+        методом keyset(decoded, limit) — см. posts.timeline.Timeline.
+        """
+        queryset = self.object_list
+        if hasattr(queryset, 'keyset'):
+            return queryset.keyset(decoded, limit)
+        field = self.field
+        if decoded is None:
+            return list(queryset.order_by(f'-{field}', '-pk')[:limit])
+        direction, moment, pk = decoded
+        if direction == NEXT:
+            return list(
+                queryset.filter(
+                    Q(**{f'{field}__lt': moment})
+                    | Q(**{field: moment, 'pk__lt': pk})
+                ).order_by(f'-{field}', '-pk')[:limit])
+        return list(
+            queryset.filter(
+                Q(**{f'{field}__gt': moment})
+                | Q(**{field: moment, 'pk__gt': pk})
+            ).order_by(field, 'pk')[:limit])
+
+    def page(self, cursor):
+        """Возвращает страницу после (или до) позиции из токена."""
+        decoded = decode_cursor(cursor) if cursor else None
+        field = self.field
+        direction = decoded[0] if decoded else NEXT
+        rows = self.rows(decoded, self.per_page + 1)
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self, is_first=decoded is None)
+
+        if direction == NEXT:
+            has_next, has_previous = has_more, decoded is not None
+        else:
+            has_next, has_previous = True, has_more
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                encode_cursor(rows[-1], NEXT, field) if has_next else None
+            ),
+            previous_cursor=(
+                encode_cursor(rows[0], PREVIOUS, field)
+                if has_previous else None
+            ),
+        )
@@ -0,0 +1,174 @@
+"""Рекомендации «кого почитать» по графу подписок.
+
+rebuild читает Follow один раз и держит граф в виде CSR: смещения
+вершин и концы ребер в массивах array, отдельно для подписок
+и для подписчиков, — без объекта Python на ребро. Затем пользователи
+обходятся пачками, и для каждого складываются две оценки кандидатов:
+
+- друзья друзей: число его авторов, которые подписаны на кандидата;
+- совместные подписки: кандидата читают подписчики его авторов;
+  вклад общего автора делится на число его подписчиков, так что
+  популярные авторы связывают слабее.
+
+Лучшие POSTS_SUGGESTIONS авторов ложатся в Suggestion; свободные
+места (и все места у тех, кто ни на кого не подписан) занимают самые
+популярные авторы. Пересборку запускает по расписанию команда
+build_recommendations.
+"""
+import heapq
+from array import array
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from core.cache import get_or_compute
+
+from . import follows
+from .cache import bump_version, get_version
+from .models import Follow, Suggestion
+
+User = get_user_model()
+
+SUGGESTIONS_KEY = 'posts:suggestions:{}'
+# Сколько рекомендаций показывать на странице.
+SHOWN = 5
+# Сколько подписчиков общего автора смотреть для совместных подписок.
+FANOUT = 100
+
+
+def top_n():
+    return getattr(settings, 'POSTS_SUGGESTIONS', 20)
+
+
+def _csr(size, sources, targets):
+    """Смещения и концы ребер: соседи i — ends[starts[i]:starts[i + 1]]."""
+    starts = array('l', [0]) * (size + 1)
+    for source in sources:
+        starts[source + 1] += 1
+    for i in range(size):
+        starts[i + 1] += starts[i]
+    position = starts[:-1]
+    ends = array('l', [0]) * len(sources)
+    for source, target in zip(sources, targets):
+        ends[position[source]] = target
+        position[source] += 1
+    return starts, ends
+
+
+class FollowGraph:
+    """Граф подписок на плотных номерах вершин."""
+
+    def __init__(self, pairs):
+        users, authors = array('l'), array('l')
+        for user_id, author_id in pairs:
+            users.append(user_id)
+            authors.append(author_id)
+        self.ids = sorted(set(users) | set(authors))
+        self.index = {pk: i for i, pk in enumerate(self.ids)}
+        sources = array('l', (self.index[pk] for pk in users))
+        targets = array('l', (self.index[pk] for pk in authors))
+        self.following = _csr(len(self.ids), sources, targets)
+        self.followers = _csr(len(self.ids), targets, sources)
+
+    @staticmethod
+    def neighbours(csr, i):
+        starts, ends = csr
+        return ends[starts[i]:starts[i + 1]]
+
+    def popular(self, limit):
+        """Номера самых читаемых авторов."""
+        starts = self.followers[0]
+        readers = {i: starts[i + 1] - starts[i] for i in range(len(self.ids))}
+        return heapq.nlargest(
+            limit, (i for i, count in readers.items() if count),
+            key=lambda i: (readers[i], -i))
+
+    def scores(self, i, fanout=FANOUT):
+        """Оценки кандидатов для вершины i: {j: (друзья, совместные)}."""
+        mine = self.neighbours(self.following, i)
+        friends, cofollow = {}, {}
+        for author in mine:
+            for candidate in self.neighbours(self.following, author):
+                friends[candidate] = friends.get(candidate, 0) + 1
+            readers = self.neighbours(self.followers, author)
+            weight = 1 / len(readers)
+            for reader in readers[:fanout]:
+                if reader == i:
+                    continue
+                for candidate in self.neighbours(self.following, reader):
+                    cofollow[candidate] = cofollow.get(
+                        candidate, 0.0) + weight
+        excluded = set(mine) | {i}
+        return {
+            j: (friends.get(j, 0), cofollow.get(j, 0.0))
+            for j in friends.keys() | cofollow.keys() if j not in excluded
+        }
+
+
+def suggest(graph, user_id, limit, popular):
+    """Suggestion для одного пользователя, лучшие первыми."""
+    i = graph.index.get(user_id)
+    found = []
+    if i is not None:
+        scores = graph.scores(i)
+        best = heapq.nlargest(
+            limit, scores.items(),
+            key=lambda item: (sum(item[1]), -item[0]))
+        for j, (friends, cofollow) in best:
+            found.append(Suggestion(
+                user_id=user_id, author_id=graph.ids[j],
+                score=friends + cofollow,
+                reason=(Suggestion.FRIENDS if friends >= cofollow
+                         else Suggestion.COFOLLOW)))
+    taken = {suggestion.author_id for suggestion in found}
+    if i is not None:
+        taken.update(graph.ids[j] for j in graph.neighbours(
+            graph.following, i))
+    for rank, j in enumerate(popular):
+        if len(found) >= limit:
+            break
+        author_id = graph.ids[j]
+        if author_id != user_id and author_id not in taken:
+            # ниже любой оценки по графу, в порядке популярности
+            found.append(Suggestion(
+                user_id=user_id, author_id=author_id,
+                score=-rank - 1, reason=Suggestion.POPULAR))
+    return found
+
+
+def rebuild(limit=None, batch_size=1000):
+    """Пересчитывает рекомендации всех пользователей; возвращает их число."""
+    limit = limit or top_n()
+    graph = FollowGraph(Follow.objects.values_list(
+        'user_id', 'author_id').iterator(chunk_size=10000))
+    # С запасом: из популярных отсеются сам пользователь и его авторы.
+    popular = graph.popular(limit * 2 + 1)
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    total = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = [
+            suggestion for user_id in batch
+            for suggestion in suggest(graph, user_id, limit, popular)]
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=batch).delete()
+            Suggestion.objects.bulk_create(suggestions)
+        total += len(suggestions)
+    bump_version('suggestions')
+    return total
+
+
+def suggestions_for(user, limit=SHOWN, exclude=()):
+    """Рекомендации для страницы без авторов, на которых user уже подписан."""
+    if not user.is_authenticated:
+        return []
+    stored = get_or_compute(
+        SUGGESTIONS_KEY.format(user.pk),
+        lambda: list(Suggestion.objects.filter(
+            user_id=user.pk).select_related('author')[:top_n()]),
+        version=get_version('suggestions'),
+    )
+    hidden = follows.following_ids(user.pk) | set(exclude)
+    return [suggestion for suggestion in stored
+            if suggestion.author_id not in hidden][:limit]
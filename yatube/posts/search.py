@@ -0,0 +1,273 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс — отдельная таблица posts_search: виртуальная FTS5 на SQLite
+или tsvector с GIN-индексом на PostgreSQL (создается миграцией 0019).
+Строки индекса обновляются сигналами при сохранении и удалении
+постов и комментариев. Результаты ранжируются (bm25 / ts_rank)
+и листаются по ключу (ранг, id строки) без OFFSET.
+"""
+import re
+
+from django.core import signing
+from django.db import connection
+
+from .models import Comment, Post
+from .stemmer import stem
+
+TABLE = 'posts_search'
+CURSOR_SALT = 'posts.search'
+POST = 'post'
+COMMENT = 'comment'
+WORD = re.compile(r'\w+')
+
+
+def doc_id(kind, pk):
+    """id строки индекса: посты — четные, комментарии — нечетные."""
+    return pk * 2 + (kind == COMMENT)
+
+
+def parse_doc_id(value):
+    return (COMMENT if value % 2 else POST), value // 2
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text)]
+
+
+class SqliteBackend:
+    """FTS5; русский стемминг делает posts.stemmer."""
+
+    create_sql = (
+        f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+        f"body, post_id UNINDEXED, tokenize='unicode61 remove_diacritics 0')"
+    )
+    drop_sql = f'DROP TABLE {TABLE}'
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(row_id,) for row_id, _, _ in rows])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, body, post_id) VALUES (%s, %s, %s)',
+            [(row_id, ' '.join(stems(text)), post_id)
+             for row_id, post_id, text in rows])
+
+    def remove(self, cursor, row_ids):
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(row_id,) for row_id in row_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    @staticmethod
+    def _terms(query):
+        # Каждая основа в кавычках и как префикс: синтаксис FTS5
+        # из запроса пользователя не попадает в MATCH.
+        return ' '.join(f'"{term}"*' for term in stems(query))
+
+    def ids_sql(self, query, kind):
+        terms = self._terms(query)
+        if not terms:
+            return f'SELECT rowid FROM {TABLE} WHERE 0', []
+        return (f'SELECT rowid / 2 FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s AND rowid %% 2 = %s',
+                [terms, int(kind == COMMENT)])
+
+    def search(self, cursor, query, limit, after=None, kind=None):
+        terms = self._terms(query)
+        if not terms:
+            return []
+        sql = (f'SELECT rowid, post_id, bm25({TABLE}) FROM {TABLE} '
+               f'WHERE {TABLE} MATCH %s')
+        params = [terms]
+        if kind is not None:
+            sql += ' AND rowid %% 2 = %s'
+            params.append(int(kind == COMMENT))
+        if after is not None:
+            sql += (f' AND (bm25({TABLE}) > %s'
+                    f' OR (bm25({TABLE}) = %s AND rowid > %s))')
+            params += [after[0], after[0], after[1]]
+        sql += f' ORDER BY bm25({TABLE}), rowid LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+class PostgresBackend:
+    """tsvector со словарем russian."""
+
+    create_sql = (
+        f'CREATE TABLE {TABLE} (id bigint PRIMARY KEY, '
+        f'post_id integer NOT NULL, document tsvector NOT NULL); '
+        f'CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)'
+    )
+    drop_sql = f'DROP TABLE {TABLE}'
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (id, post_id, document) "
+            f"VALUES (%s, %s, to_tsvector('russian', %s)) "
+            f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document",
+            rows)
+
+    def remove(self, cursor, row_ids):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE id = ANY(%s)', [list(row_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLE}')
+
+    def ids_sql(self, query, kind):
+        return (f"SELECT id / 2 FROM {TABLE}, "
+                f"plainto_tsquery('russian', %s) query "
+                f"WHERE document @@ query AND id %% 2 = %s",
+                [query, int(kind == COMMENT)])
+
+    def search(self, cursor, query, limit, after=None, kind=None):
+        # Ранг со знаком минус: как и у bm25, лучшие — первыми по возрастанию.
+        score = 'round((-ts_rank(document, query))::numeric, 6)::float'
+        sql = (f"SELECT id, post_id, {score} FROM {TABLE}, "
+               f"plainto_tsquery('russian', %s) query "
+               f"WHERE document @@ query")
+        params = [query]
+        if kind is not None:
+            sql += ' AND id %% 2 = %s'
+            params.append(int(kind == COMMENT))
+        if after is not None:
+            sql += f' AND ({score} > %s OR ({score} = %s AND id > %s))'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY 3, id LIMIT %s'
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def backend(conn=None):
+    """Поисковый бэкенд базы или None, если она не поддерживается."""
+    backend_class = BACKENDS.get((conn or connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def _rows(objects):
+    return [
+        (doc_id(COMMENT, obj.pk), obj.post_id, obj.text)
+        if isinstance(obj, Comment)
+        else (doc_id(POST, obj.pk), obj.pk, obj.text)
+        for obj in objects
+    ]
+
+
+def index(objects):
+    """Добавляет или обновляет в индексе посты и комментарии."""
+    search_backend = backend()
+    rows = _rows(objects)
+    if search_backend is not None and rows:
+        with connection.cursor() as cursor:
+            search_backend.index(cursor, rows)
+
+
+def remove(kind, pks):
+    search_backend = backend()
+    if search_backend is not None and pks:
+        with connection.cursor() as cursor:
+            search_backend.remove(cursor, [doc_id(kind, pk) for pk in pks])
+
+
+def index_all(posts, comments, batch_size=1000, conn=None):
+    """Индексирует все посты и комментарии пачками по batch_size.
+
+    posts и comments — QuerySet'ы; миграция передает сюда
+    исторические модели, поэтому строки собираются из values_list.
+    Возвращает число проиндексированных строк.
+    """
+    conn = conn or connection
+    search_backend = backend(conn)
+    if search_backend is None:
+        return 0
+    sources = (
+        (POST, posts.values_list('pk', 'pk', 'text')),
+        (COMMENT, comments.values_list('pk', 'post_id', 'text')),
+    )
+    total = 0
+    for kind, queryset in sources:
+        batch = []
+        for pk, post_id, text in queryset.order_by('pk').iterator(
+                chunk_size=batch_size):
+            batch.append((doc_id(kind, pk), post_id, text))
+            if len(batch) == batch_size:
+                with conn.cursor() as cursor:
+                    search_backend.index(cursor, batch)
+                total, batch = total + len(batch), []
+        if batch:
+            with conn.cursor() as cursor:
+                search_backend.index(cursor, batch)
+            total += len(batch)
+    return total
+
+
+def rebuild(batch_size=1000):
+    """Строит индекс заново; возвращает число проиндексированных строк."""
+    search_backend = backend()
+    if search_backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        search_backend.clear(cursor)
+    return index_all(Post.objects.all(), Comment.objects.all(), batch_size)
+
+
+def encode_cursor(score, row_id):
+    return signing.dumps([score, row_id], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    try:
+        score, row_id = signing.loads(token, salt=CURSOR_SALT)
+        return float(score), int(row_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def search(query, limit=10, cursor=None):
+    """Одна страница результатов по убыванию релевантности.
+
+    Возвращает (hits, next_cursor); hit — (вид, id, id поста).
+    """
+    search_backend = backend()
+    after = decode_cursor(cursor) if cursor else None
+    if search_backend is None or not query.strip():
+        return [], None
+    with connection.cursor() as db_cursor:
+        rows = search_backend.search(db_cursor, query, limit + 1, after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+    hits = [(*parse_doc_id(row_id), post_id) for row_id, post_id, _ in rows]
+    return hits, next_cursor
+
+
+def matching_sql(kind, query):
+    """Подзапрос (sql, params) с id постов или комментариев по запросу.
+
+    Для поиска в админке: совпадения не ограничены числом и не
+    переносятся в Python, а фильтруют queryset через pk IN (...).
+    """
+    search_backend = backend()
+    if search_backend is None or not query.strip():
+        return None
+    return search_backend.ids_sql(query, kind)
+
+
+def matching_ids(kind, query):
+    """Все id постов или комментариев по запросу."""
+    found = matching_sql(kind, query)
+    if found is None:
+        return None
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(*found)
+        return [pk for pk, in db_cursor.fetchall()]
@@ -0,0 +1,230 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search, storage, thumbnails, timeline
+from .cache import bump_version
+from .models import Comment, Follow, Group, Post, Suggestion, UserStats
+
+User = get_user_model()
+
+# Внутри follows_in_bulk подписки меняет posts.follows пачкой
+# и сам обновляет счетчики, ленту и версии (см. follows._changed).
+_follows_in_bulk = ContextVar('follows_in_bulk', default=False)
+
+
+@contextmanager
+def follows_in_bulk():
+    """Обработчики Follow пропускают подписки, меняемые пачкой."""
+    token = _follows_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        _follows_in_bulk.reset(token)
+
+
+def _in_bulk(instance):
+    return isinstance(instance, Follow) and _follows_in_bulk.get()
+
+
+def _shift(counters, delta):
+    with transaction.atomic():
+        for user_id, field in counters:
+            UserStats.objects.increment(user_id, field, delta)
+
+
+def _counters(instance):
+    if isinstance(instance, Follow):
+        return (
+            (instance.author_id, 'followers_count'),
+            (instance.user_id, 'following_count'),
+        )
+    field = 'posts_count' if isinstance(instance, Post) else 'comments_count'
+    return ((instance.author_id, field),)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Follow)
+def stats_on_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not _in_bulk(instance):
+        _shift(_counters(instance), 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Follow)
+def stats_on_delete(sender, instance, **kwargs):
+    if not _in_bulk(instance):
+        _shift(_counters(instance), -1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    # При смене группы сбросить нужно и ленту прежней группы,
+    # при смене картинки — проверить, нужна ли еще прежняя.
+    instance._old_group_id = instance._old_image = None
+    if instance.pk and not raw:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if old is not None:
+            instance._old_group_id, instance._old_image = old
+
+
+def _bump(signal, *names):
+    """Сбрасывает версии; после удаления — только после коммита.
+
+    post_delete шлется внутри транзакции Collector: версия, поднятая
+    до коммита, позволила бы другому запросу сохранить под ней
+    страницу с еще не удаленными данными.
+    """
+    if signal is post_delete:
+        transaction.on_commit(lambda: bump_version(*names))
+    else:
+        bump_version(*names)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, signal, created=False, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True)
+    author = User.objects.filter(pk=instance.author_id).values_list(
+        'username', flat=True).first()
+    names = [
+        'posts',
+        f'post:{instance.pk}',
+        f'author:{author}',
+        *(f'group:{slug}' for slug in slugs),
+    ]
+    # Ленты подписок кешируют только выбор постов: правка поста
+    # его места в них не меняет, а новый или удаленный пост
+    # сбрасывает одну версию автора, а не версию каждого подписчика.
+    if created or signal is post_delete:
+        names.append(f'author_feed:{instance.author_id}')
+    _bump(signal, *names)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    bump_version('groups')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, signal, **kwargs):
+    _bump(signal, f'comments:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    if _in_bulk(instance):
+        return
+    bump_version(
+        f'follows:{instance.user_id}', f'follow_feed:{instance.user_id}')
+
+
+# Поля пользователя, которые выводятся на страницах.
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    instance._old_names = None
+    if update_fields is not None and not set(
+            update_fields) & set(USER_DISPLAY_FIELDS):
+        return
+    if instance.pk and not raw:
+        instance._old_names = User.objects.filter(
+            pk=instance.pk).values_list(*USER_DISPLAY_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, raw=False, **kwargs):
+    # Регистрация, вход, смена пароля страниц не меняют; новое имя
+    # сбрасывает только страницы, где оно выводится: ленты с постами
+    # автора, его профиль, обсуждения с его комментариями, блоки
+    # рекомендаций и шапку страниц самого пользователя.
+    old = getattr(instance, '_old_names', None)
+    names = tuple(getattr(instance, field) for field in USER_DISPLAY_FIELDS)
+    if created or raw or old is None or old == names:
+        return
+    user_id = instance.pk
+    slugs = Group.objects.filter(posts__author_id=user_id).values_list(
+        'slug', flat=True).distinct()
+    commented = Comment.objects.filter(author_id=user_id).values_list(
+        'post_id', flat=True).distinct()
+    versions = [
+        f'user:{user_id}',
+        f'author:{old[0]}',
+        f'author:{instance.username}',
+        *(f'group:{slug}' for slug in slugs),
+        *(f'comments:{post_id}' for post_id in commented.iterator()),
+    ]
+    if Post.objects.filter(author_id=user_id).exists():
+        versions.append('posts')
+    if Suggestion.objects.filter(author_id=user_id).exists():
+        versions.append('suggestions')
+    bump_version(*versions)
+
+
+@receiver(post_save, sender=Post)
+def timeline_fan_out(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and timeline.is_enabled():
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def timeline_backfill(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and timeline.is_enabled() and not _in_bulk(
+            instance):
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def timeline_prune(sender, instance, **kwargs):
+    if timeline.is_enabled() and not _in_bulk(instance):
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, created, raw=False, **kwargs):
+    # Правка текста картинку не меняет: нарезать ее заново незачем.
+    if instance.image and not raw and (
+            created or instance._old_image != instance.image.name):
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def collect_replaced_image(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if old_image and old_image != instance.image.name and not raw:
+        transaction.on_commit(lambda: storage.collect(old_image))
+
+
+@receiver(post_delete, sender=Post)
+def collect_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: storage.collect(name))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def search_index(sender, instance, **kwargs):
+    search.index([instance])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def search_remove(sender, instance, **kwargs):
+    kind = search.POST if sender is Post else search.COMMENT
+    search.remove(kind, [instance.pk])
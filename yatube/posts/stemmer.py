@@ -0,0 +1,78 @@
+"""Стеммер Snowball для русского языка.
+
+Нужен поиску на SQLite: FTS5 умеет стемминг только английского,
+поэтому в индекс и в запрос попадают уже обрезанные основы.
+Алгоритм: https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+REFLEXIVE = re.compile(r'(ся|сь)$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем'
+    r'|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+
+
+def _region(word, start=0):
+    """Начало области после первой пары «гласная, согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    """Основа русского слова; прочие слова возвращаются как есть."""
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), None)
+    if rv_start is None:
+        return word
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = _region(word, _region(word)) - rv_start
+
+    # Шаг 1: деепричастие, иначе возвратность и окончание.
+    stripped = PERFECTIVE_GERUND.sub('', rv, count=1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, count=1)
+        stripped = ADJECTIVE.sub('', rv, count=1)
+        if stripped != rv:
+            stripped = PARTICIPLE.sub('', stripped, count=1)
+        else:
+            stripped = VERB.sub('', rv, count=1)
+            if stripped == rv:
+                stripped = NOUN.sub('', rv, count=1)
+    rv = stripped
+
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2.
+    match = DERIVATIONAL.search(rv)
+    if match and match.start() >= r2_start:
+        rv = rv[:match.start()]
+
+    # Шаг 4.
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        stripped = SUPERLATIVE.sub('', rv, count=1)
+        if stripped != rv:
+            rv = stripped[:-1] if stripped.endswith('нн') else stripped
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
@@ -0,0 +1,112 @@
+"""Хранилище картинок постов, адресуемое по содержимому.
+
+Файл называется хешем своего содержимого: одинаковые загрузки
+ложатся в один файл и делят его миниатюры и варианты. Ссылками
+на файл служат посты с этим image; когда последняя ссылка
+пропадает, collect удаляет файл вместе с производными.
+
+Загрузка, совпавшая с уже лежащим файлом, не пишет его заново,
+а только обновляет время изменения, и ссылкой пост станет лишь после
+коммита. Поэтому collect не трогает файлы моложе COLLECT_GRACE,
+а перед удалением отодвигает файл в сторону и проверяет все еще раз:
+загрузка, опоздавшая к переносу, просто запишет файл заново.
+Оставшиеся без ссылок файлы подбирает команда collect_images.
+"""
+import hashlib
+import logging
+import os
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 32
+# Сколько секунд после записи или повторной загрузки файл не удаляется.
+COLLECT_GRACE = 10 * 60
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который не хранит дубликаты."""
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, digest.hexdigest()[:HASH_LENGTH] + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        try:
+            # Свежее время изменения защищает файл от collect.
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+
+
+# Хранилище поля Post.image.
+image_storage = ContentAddressedStorage()
+
+
+def references(name):
+    """Сколько постов ссылается на файл name."""
+    from .models import Post
+    return Post.objects.filter(image=name).count()
+
+
+def _is_recent(path, grace):
+    return time.time() - os.path.getmtime(path) < grace
+
+
+def collect(name, grace=COLLECT_GRACE):
+    """Удаляет файл, миниатюры и варианты, если ссылок не осталось.
+
+    Возвращает True, если файл удален.
+    """
+    from .models import ImageVariant
+    if not name or references(name):
+        return False
+    try:
+        path = image_storage.path(name)
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT: файл не наш, его не трогаем.
+        return False
+    removed = f'{path}.collect'
+    try:
+        if _is_recent(path, grace):
+            return False
+        os.replace(path, removed)
+    except FileNotFoundError:
+        return False
+    # Загрузка, успевшая до переноса, обновила время изменения.
+    if _is_recent(removed, grace) or references(name):
+        os.replace(removed, path)
+        logger.info('Файл %s снова используется, не удаляем', name)
+        return False
+
+    variants = ImageVariant.objects.filter(source=name)
+    files = set(variants.values_list('image', flat=True))
+    variants.delete()
+    # Варианты названы хешем содержимого и могут быть общими
+    # с картинкой, загруженной до этого хранилища.
+    shared = set(ImageVariant.objects.filter(
+        image__in=files).values_list('image', flat=True))
+    for variant in files - shared:
+        default_storage.delete(variant)
+
+    # Удаляет и миниатюры sorl вместе с их файлами.
+    default.kvstore.delete(ImageFile(name, image_storage))
+    os.remove(removed)
+    return True
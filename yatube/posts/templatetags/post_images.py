@@ -0,0 +1,32 @@
+from django import template
+from django.templatetags.static import static
+
+from posts import thumbnails, variants
+
+register = template.Library()
+
+PLACEHOLDER = 'img/thumbnail-pending.svg'
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, sizes='(max-width: 960px) 100vw, 960px'):
+    """Картинка поста как <picture> с srcset по ширинам и форматам.
+
+    Варианты берутся из post.variants (см. posts.variants.attach);
+    пока они не нарезаны, выводится заглушка, а картинка ставится
+    в очередь фонового пула.
+    """
+    if not post.image:
+        return {}
+    if getattr(post, 'variants', None) is None:
+        variants.attach([post])
+    sources, srcset, fallback = variants.srcsets(post.variants)
+    if fallback is None:
+        thumbnails.schedule(post.image.name)
+        return {'placeholder': static(PLACEHOLDER)}
+    return {
+        'sources': sources,
+        'srcset': srcset,
+        'fallback': fallback,
+        'sizes': sizes,
+    }
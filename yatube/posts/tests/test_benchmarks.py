@@ -0,0 +1,54 @@
+# posts/tests/test_benchmarks.py
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.benchmarks import compare, measure, private_caches
+from posts.models import Post
+
+User = get_user_model()
+
+
+class BenchmarkHelpersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def test_measure_reports_all_metrics(self):
+        """measure считает задержки, запросы к базе и пик памяти."""
+        client = Client()
+        result = measure(lambda: client.get(reverse('posts:index')), 3)
+        self.assertEqual(result['status'], [200])
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['peak_kb'], 0)
+        self.assertLessEqual(result['p50_ms'], result['max_ms'])
+
+    def test_warm_cache_skips_queries(self):
+        """С прогретым кешем лента не ходит в базу за постами."""
+        client = Client()
+        cold = measure(lambda: client.get(reverse('posts:index')), 3)
+        warm = measure(
+            lambda: client.get(reverse('posts:index')), 3, warm=True)
+        self.assertLess(warm['queries'], cold['queries'])
+
+    def test_compare_reports_relative_change(self):
+        old = {'views': {'index': {'p50_ms': 10, 'queries': 4}}}
+        new = {'views': {'index': {'p50_ms': 15, 'queries': 4},
+                         'profile': {'p50_ms': 1}}}
+        diff = compare(old, new, keys=('p50_ms', 'queries'))
+        self.assertEqual(diff, {'index': {
+            'p50_ms': (10, 15, 50.0), 'queries': (4, 4, 0.0)}})
+
+    def test_private_caches_keep_shared_cache(self):
+        """Бенчмарк чистит свой кеш в памяти, а не общий кеш сайта."""
+        cache.set('benchmark-test', 'site')
+        self.addCleanup(cache.delete, 'benchmark-test')
+        with private_caches():
+            self.assertIsNone(cache.get('benchmark-test'))
+            cache.set('benchmark-test', 'benchmark')
+            cache.clear()
+            self.assertEqual(
+                caches['shared'].__class__.__name__, 'LocMemCache')
+        self.assertEqual(cache.get('benchmark-test'), 'site')
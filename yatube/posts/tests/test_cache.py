@@ -0,0 +1,408 @@
+# posts/tests/test_cache.py
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import cache as stampede
+from core.file_cache import LockingFileBasedCache
+from core.tiered_cache import TieredCache
+from posts.cache import get_version
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import on_commit_callbacks
+
+User = get_user_model()
+
+
+class StampedeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def test_value_is_computed_once(self):
+        """Свежее значение берется из кеша без пересчета."""
+        for _ in range(3):
+            value = stampede.get_or_compute('key', self.compute, version=1)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_new_version_recomputes(self):
+        """Смена версии приводит к пересчету."""
+        stampede.get_or_compute('key', self.compute, version=1)
+        value = stampede.get_or_compute('key', self.compute, version=2)
+        self.assertEqual(value, 'значение 2')
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой воркер держит блокировку, отдается старая копия."""
+        stampede.get_or_compute('key', self.compute, version=1)
+        cache.add(stampede.LOCK_KEY.format('key'), 1)
+        value = stampede.get_or_compute('key', self.compute, version=2)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    @mock.patch.object(stampede, 'LOCK_WAIT', 0.1)
+    def test_compute_after_wait_without_stale_copy(self):
+        """Без копии и при чужой блокировке значение считается само."""
+        cache.add(stampede.LOCK_KEY.format('key'), 1)
+        value = stampede.get_or_compute('key', self.compute, version=1)
+        self.assertEqual(value, 'значение 1')
+
+    def test_lock_is_released(self):
+        """Блокировка снимается и при ошибке пересчета."""
+        def broken():
+            raise RuntimeError
+        with self.assertRaises(RuntimeError):
+            stampede.get_or_compute('key', broken, version=1)
+        self.assertIsNone(cache.get(stampede.LOCK_KEY.format('key')))
+
+    def test_early_expiry(self):
+        """Долгий пересчет перед истечением срока запускается заранее."""
+        stampede.get_or_compute('key', self.compute, timeout=60)
+        entry = cache.get('key')
+        entry['delta'] = 10 ** 6
+        cache.set('key', entry)
+        value = stampede.get_or_compute('key', self.compute, timeout=60)
+        self.assertEqual(value, 'значение 2')
+
+    def test_template_tag(self):
+        """Тег stampede_cache кеширует фрагмент по версии."""
+        template = Template(
+            '{% load stampede_cache %}'
+            '{% stampede_cache None fragment version %}'
+            '{{ text }}{% endstampede_cache %}'
+        )
+
+        def render(**context):
+            return template.render(Context(context))
+
+        self.assertEqual(render(text='раз', version=1), 'раз')
+        self.assertEqual(render(text='два', version=1), 'раз')
+        self.assertEqual(render(text='два', version=2), 'два')
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TieredCache('test', {'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 60,
+            'LOCAL_EXCLUDE': ['posts:version:'],
+        }})
+        self.cache.clear()
+
+    def test_second_read_served_by_l1(self):
+        """Повторное чтение не доходит до общего кеша."""
+        self.cache.shared.set('key', 'значение')
+        before = self.cache.stats()
+        self.assertEqual(self.cache.get('key'), 'значение')
+        self.assertEqual(self.cache.get('key'), 'значение')
+        after = self.cache.stats()
+        self.assertEqual(after['l1']['hits'] - before['l1']['hits'], 1)
+        self.assertEqual(after['l2']['hits'] - before['l2']['hits'], 1)
+
+    def test_write_goes_to_both_tiers(self):
+        """set пишет и в L1, и в L2."""
+        self.cache.set('key', 'значение')
+        self.assertEqual(self.cache.local.get('key'), 'значение')
+        self.assertEqual(self.cache.shared.get('key'), 'значение')
+
+    def test_excluded_keys_stay_shared(self):
+        """Версии данных не кешируются локально."""
+        self.cache.set('posts:version:group:1', 1)
+        self.cache.shared.set('posts:version:group:1', 2)
+        self.assertIsNone(self.cache.local.get('posts:version:group:1'))
+        self.assertEqual(self.cache.get('posts:version:group:1'), 2)
+
+    def test_add_and_incr_are_shared(self):
+        """Блокировки и счетчики живут только в L2."""
+        self.assertTrue(self.cache.add('lock', 1))
+        self.assertFalse(self.cache.add('lock', 1))
+        self.assertEqual(self.cache.incr('lock'), 2)
+        self.assertIsNone(self.cache.local.get('lock'))
+
+    def test_delete_clears_both_tiers(self):
+        """delete убирает ключ с обоих уровней."""
+        self.cache.set('key', 'значение')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_other_worker_recompute_is_reused(self):
+        """Свежее значение другого воркера берется из L2 без пересчета."""
+        with mock.patch.object(stampede, 'cache', self.cache):
+            stampede.get_or_compute('key', lambda: 'старое', version=1)
+            # другой воркер пересчитал значение под новой версией
+            self.cache.shared.set('key', {
+                'value': 'новое', 'version': 2,
+                'delta': 0, 'expires': None,
+            })
+            value = stampede.get_or_compute(
+                'key', lambda: 'пересчет', version=2)
+        self.assertEqual(value, 'новое')
+
+
+class LockingFileBasedCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return LockingFileBasedCache(self.directory, {'OPTIONS': options})
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_incr_keeps_every_increment(self):
+        """Одновременные incr не теряют приращений."""
+        cache = self.make_cache()
+        cache.set('posts:version:posts', 0)
+
+        def bump():
+            for _ in range(25):
+                cache.incr('posts:version:posts')
+
+        self.run_threads(bump)
+        self.assertEqual(cache.get('posts:version:posts'), 200)
+
+    def test_only_one_add_wins(self):
+        """Блокировку пересчета берет ровно один из конкурентов."""
+        cache = self.make_cache()
+        results = []
+        self.run_threads(lambda: results.append(cache.add('key:lock', 1)))
+        self.assertEqual(results.count(True), 1)
+
+    def test_versions_and_locks_survive_culling(self):
+        """Вытеснение не трогает версии данных и блокировки."""
+        cache = self.make_cache(
+            MAX_ENTRIES=5, CULL_FREQUENCY=1, CULL_EVERY=1,
+            PERSISTENT=['posts:version:'])
+        cache.set('posts:version:posts', 1)
+        cache.add('page:lock', 1)
+        for number in range(20):
+            cache.set(f'page:{number}', number)
+        self.assertEqual(cache.get('posts:version:posts'), 1)
+        self.assertEqual(cache.get('page:lock'), 1)
+        self.assertLess(len(cache._list_cache_files()), 6)
+        cache.clear()
+        self.assertIsNone(cache.get('posts:version:posts'))
+
+    def test_directory_listed_every_cull_every_sets(self):
+        """Каталог перечисляется не на каждую запись."""
+        cache = self.make_cache(CULL_EVERY=10)
+        with mock.patch.object(
+                cache, '_list_cache_files', return_value=[]) as listing:
+            for number in range(30):
+                cache.set(f'page:{number}', number)
+        self.assertEqual(listing.call_count, 3)
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Первый пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(FeedCacheTests.reader)
+
+    def get(self, url, client=None):
+        return (client or self.client).get(url).content.decode()
+
+    def test_feeds_are_cached(self):
+        """Ленты группы, профиля и подписок отдаются из кеша."""
+        Follow.objects.create(
+            user=FeedCacheTests.reader, author=FeedCacheTests.author)
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': 'group-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.reader_client.get(url)
+                # сессия и пользователь для login_required; лента
+                # подписок еще читает посты страницы по id из кеша
+                queries = 3 if url == reverse('posts:follow_index') else 2
+                with self.assertNumQueries(queries):
+                    response = self.reader_client.get(url)
+                self.assertContains(response, 'Первый пост')
+
+    def test_new_post_invalidates_only_its_feeds(self):
+        """Новый пост сбрасывает ленты своей группы, автора и подписчиков."""
+        Follow.objects.create(
+            user=FeedCacheTests.reader, author=FeedCacheTests.author)
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group-slug'})
+        other_url = reverse('posts:group_list', kwargs={'slug': 'other-slug'})
+        profile_url = reverse('posts:profile', kwargs={'username': 'author'})
+        follow_url = reverse('posts:follow_index')
+        other_page = self.get(other_url)
+        self.get(group_url)
+        self.get(profile_url)
+        self.get(follow_url, self.reader_client)
+        Post.objects.create(
+            author=FeedCacheTests.author, text='Второй пост',
+            group=FeedCacheTests.group)
+        self.assertIn('Второй пост', self.get(group_url))
+        self.assertIn('Второй пост', self.get(profile_url))
+        self.assertIn('Второй пост', self.get(follow_url, self.reader_client))
+        self.assertEqual(other_page, self.get(other_url))
+
+    def test_post_edit_keeps_follow_feed_selection(self):
+        """Правка поста видна в ленте подписок без сброса ее кеша."""
+        Follow.objects.create(
+            user=FeedCacheTests.reader, author=FeedCacheTests.author)
+        follow_url = reverse('posts:follow_index')
+        self.get(follow_url, self.reader_client)
+        name = f'author_feed:{FeedCacheTests.author.pk}'
+        version = get_version(name)
+        post = Post.objects.get(pk=FeedCacheTests.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(version, get_version(name))
+        self.assertIn(
+            'Исправленный пост', self.get(follow_url, self.reader_client))
+
+    def test_new_post_does_not_touch_followers_versions(self):
+        """Новый пост не перебирает подписчиков автора."""
+        readers = [User.objects.create_user(username=f'reader{i}')
+                   for i in range(20)]
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=FeedCacheTests.author)
+             for reader in readers])
+        with mock.patch('posts.signals.bump_version') as bump:
+            Post.objects.create(author=FeedCacheTests.author, text='Пост')
+        names = bump.call_args[0]
+        self.assertIn(f'author_feed:{FeedCacheTests.author.pk}', names)
+        self.assertFalse(
+            [name for name in names if name.startswith('follow_feed:')])
+
+    def test_delete_bumps_versions_after_commit(self):
+        """Удаление поста и комментария сбрасывает версии после коммита."""
+        post = Post.objects.create(
+            author=FeedCacheTests.author, text='Удаляемый пост',
+            group=FeedCacheTests.group)
+        comment = Comment.objects.create(
+            post=post, author=FeedCacheTests.reader, text='Комментарий')
+        names = ('group:group-slug', f'comments:{post.pk}')
+        versions = [get_version(name) for name in names]
+        with on_commit_callbacks():
+            comment.delete()
+            post.delete()
+            self.assertEqual(
+                versions, [get_version(name) for name in names])
+        for name, version in zip(names, versions):
+            self.assertNotEqual(version, get_version(name))
+
+    def test_group_change_of_post_invalidates_old_group(self):
+        """Перенос поста в другую группу сбрасывает обе ленты групп."""
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group-slug'})
+        self.assertIn('Первый пост', self.get(group_url))
+        post = Post.objects.get(pk=FeedCacheTests.post.pk)
+        post.group = FeedCacheTests.other_group
+        post.save()
+        self.assertNotIn('Первый пост', self.get(group_url))
+
+    def test_profile_varies_by_viewer_follow_state(self):
+        """Флаг подписки на профиле свой у каждого зрителя."""
+        profile_url = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertIn('Подписаться', self.get(profile_url, self.reader_client))
+        Follow.objects.create(
+            user=FeedCacheTests.reader, author=FeedCacheTests.author)
+        self.assertIn('Отписаться', self.get(profile_url, self.reader_client))
+        self.assertNotIn('Отписаться', self.get(profile_url))
+
+
+class PostDetailCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+        self.author_client = Client()
+        self.author_client.force_login(PostDetailCacheTests.author)
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304."""
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_and_comment_change_etag(self):
+        """Правка поста и новый комментарий меняют ETag."""
+        etag = self.client.get(self.url)['ETag']
+        self.author_client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Исправленный пост'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Исправленный пост')
+
+        etag = response['ETag']
+        self.author_client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Новый комментарий'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_etag_depends_on_viewer(self):
+        """Гость и автор видят разные страницы и разные ETag."""
+        # первый ответ ставит автору CSRF-cookie, от нее зависит ETag
+        self.assertFalse(self.author_client.get(self.url).has_header('ETag'))
+        self.assertNotEqual(
+            self.client.get(self.url)['ETag'],
+            self.author_client.get(self.url)['ETag'])
+
+    def test_etag_follows_csrf_token(self):
+        """Новый CSRF-токен после входа не дает 304 со старой формой."""
+        self.author_client.cookies['csrftoken'] = 'a' * 64
+        response = self.author_client.get(self.url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        response = self.author_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.author_client.cookies['csrftoken'] = 'b' * 64
+        response = self.author_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_fragments_are_cached(self):
+        """Фрагменты поста и комментариев не пересчитываются зря."""
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(self.url)
+        self.assertLess(len(warm), len(cold))
+        # имя автора для ETag и сам пост
+        self.assertEqual(len(warm), 2)
@@ -0,0 +1,61 @@
+# posts/tests/test_database.py
+import shutil
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper
+
+
+class SqliteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def wrapper(self, **options):
+        settings_dict = {
+            **connection.settings_dict,
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': f'{self.directory}/db.sqlite3',
+            'OPTIONS': options,
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        """PRAGMA из OPTIONS выполняются на каждом соединении."""
+        wrapper = self.wrapper(pragmas={
+            'journal_mode': 'wal', 'synchronous': 'normal',
+            'cache_size': -2048,
+        })
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -2048)
+
+    def test_immediate_transactions(self):
+        """atomic() сразу берет блокировку записи."""
+        first = self.wrapper(transaction_mode='immediate', timeout=0)
+        second = self.wrapper(timeout=0)
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        # так atomic() начинает транзакцию на SQLite
+        first._start_transaction_under_autocommit()
+        try:
+            with second.cursor() as cursor, self.assertRaisesMessage(
+                    OperationalError, 'locked'):
+                cursor.execute("INSERT INTO note VALUES ('x')")
+        finally:
+            first.cursor().execute('ROLLBACK')
+
+    def test_unknown_transaction_mode(self):
+        wrapper = self.wrapper(transaction_mode='eventually')
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.ensure_connection()
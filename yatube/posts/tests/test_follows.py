@@ -0,0 +1,150 @@
+# posts/tests/test_follows.py
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import follows
+from posts.cache import get_version
+from posts.models import Follow, Post, TimelineEntry, UserStats
+from posts.tests.utils import on_commit_callbacks
+
+User = get_user_model()
+
+
+class FollowServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(FollowServiceTests.reader)
+
+    def stats(self, user):
+        return UserStats.objects.for_user(user)
+
+    def statements(self, context, verb, *parts):
+        return [query['sql'] for query in context.captured_queries
+                if query['sql'].startswith(verb)
+                and all(part in query['sql']
+                        for part in ('posts_follow', *parts))]
+
+    def test_follow_is_one_insert(self):
+        """Подписка — один INSERT, счетчики пересчитаны."""
+        author = FollowServiceTests.authors[0]
+        with CaptureQueriesContext(connection) as context, \
+                on_commit_callbacks():
+            self.client.get(
+                reverse('posts:profile_follow', args=[author.username]))
+        self.assertEqual(len(self.statements(context, 'INSERT')), 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(author).followers_count, 1)
+
+    def test_repeated_follow_writes_nothing(self):
+        author = FollowServiceTests.authors[0]
+        with on_commit_callbacks():
+            follows.follow(FollowServiceTests.reader, [author.pk])
+        follows.following_ids(FollowServiceTests.reader.pk)
+        with CaptureQueriesContext(connection) as context:
+            added = follows.follow(FollowServiceTests.reader, [author.pk])
+        self.assertEqual(added, set())
+        self.assertEqual(len(context), 0)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_bulk_follow_and_unfollow(self):
+        """Пачка подписок и отписок через JSON-ручку."""
+        url = reverse('posts:follow_bulk')
+        usernames = [author.username for author in self.authors]
+        with on_commit_callbacks():
+            response = self.client.post(url, {
+                'action': 'follow',
+                'username': usernames + ['reader', 'nobody'],
+            })
+        self.assertEqual(response.json(), {
+            'changed': usernames, 'unknown': ['nobody']})
+        self.assertEqual(self.stats(self.reader).following_count, 3)
+
+        with CaptureQueriesContext(connection) as context, \
+                on_commit_callbacks():
+            response = self.client.post(url, {
+                'action': 'unfollow', 'username': usernames[:2]})
+        self.assertEqual(len(self.statements(context, 'DELETE')), 1)
+        self.assertEqual(response.json()['changed'], usernames[:2])
+        self.assertEqual(
+            list(Follow.objects.values_list('author__username', flat=True)),
+            usernames[2:])
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 0)
+
+    def test_bulk_rejects_unknown_action(self):
+        response = self.client.post(
+            reverse('posts:follow_bulk'), {'action': 'like'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile_flag_from_cache(self):
+        """Флаг «подписан» в профиле берется из кешированного множества."""
+        author = FollowServiceTests.authors[0]
+        with on_commit_callbacks():
+            follows.follow(FollowServiceTests.reader, [author.pk])
+        follows.following_ids(FollowServiceTests.reader.pk)
+        url = reverse('posts:profile', args=[author.username])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertFalse(self.statements(
+            context, 'SELECT', '"user_id" =', '"author_id" ='))
+
+        with on_commit_callbacks():
+            follows.unfollow(FollowServiceTests.reader, [author.pk])
+        self.assertFalse(self.client.get(url).context['following'])
+
+    @override_settings(POSTS_TIMELINE=True)
+    def test_timeline_follows_subscriptions(self):
+        author = FollowServiceTests.authors[0]
+        Post.objects.create(author=author, text='Пост автора')
+        with on_commit_callbacks():
+            follows.follow(FollowServiceTests.reader, [author.pk])
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=FollowServiceTests.reader).count(), 1)
+        with on_commit_callbacks():
+            follows.unfollow(FollowServiceTests.reader, [author.pk])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_versions_bumped_after_commit(self):
+        """Версии подписок меняются только после коммита."""
+        reader = FollowServiceTests.reader
+        before = get_version(f'follows:{reader.pk}')
+        with on_commit_callbacks():
+            follows.follow(reader, [FollowServiceTests.authors[0].pk])
+            self.assertEqual(get_version(f'follows:{reader.pk}'), before)
+        self.assertNotEqual(get_version(f'follows:{reader.pk}'), before)
+
+    def test_bulk_unfollow_skips_per_row_signals(self):
+        """Пачку отписок обрабатывает _changed, а не сигнал на строку."""
+        reader = FollowServiceTests.reader
+        author_ids = [author.pk for author in FollowServiceTests.authors]
+        with on_commit_callbacks():
+            follows.follow(reader, author_ids)
+        with mock.patch('posts.signals.bump_version') as bump, \
+                mock.patch('posts.signals._shift') as shift, \
+                on_commit_callbacks():
+            follows.unfollow(reader, author_ids)
+        bump.assert_not_called()
+        shift.assert_not_called()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(reader).following_count, 0)
+
+    def test_single_follow_delete_still_signals(self):
+        """Удаление одной подписки вне пачки обновляет счетчики."""
+        author = FollowServiceTests.authors[0]
+        Follow.objects.create(user=FollowServiceTests.reader, author=author)
+        Follow.objects.get().delete()
+        self.assertEqual(self.stats(author).followers_count, 0)
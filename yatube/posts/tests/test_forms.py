@@ -1,13 +1,18 @@
+import hashlib
+import io
 import shutil
 import tempfile
+from unittest import mock
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from django.contrib.auth import get_user_model
+from posts import uploads
 from posts.forms import PostForm
 from posts.models import Post, Group, Comment
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 User = get_user_model()
 
@@ -101,7 +106,8 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 text='Тестовый текст',
                 group=1,
-                image='posts/small.gif'
+                image='posts/{}.gif'.format(
+                    hashlib.sha256(small_gif).hexdigest()[:32]),
             ).exists()
         )
 
@@ -165,3 +171,87 @@ class PostFormTests(TestCase):
                 text='Тестовый комментарий',
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_WIDTHS=[])
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ImageUploadTests.user)
+
+    def upload(self, name, content, content_type='image/jpeg'):
+        file_ = SimpleUploadedFile(name, content, content_type)
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': file_},
+        )
+
+    def jpeg(self, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    @override_settings(POSTS_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_oversized_upload_rejected(self):
+        """Файл больше лимита отклоняется, пост не создается."""
+        response = self.upload('big.jpg', self.jpeg((200, 200)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 100\xa0байт.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Разрешение проверяется по заголовку до декодирования."""
+        response = self.upload('wide.jpg', self.jpeg((20, 10)))
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение картинки.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_an_image_rejected(self):
+        """Файл, который не картинка, отклоняется."""
+        response = self.upload('fake.jpg', b'not an image')
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_FORMATS=('JPEG',))
+    def test_format_not_allowed(self):
+        """Принимаются только форматы из POSTS_IMAGE_FORMATS."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (2, 2)).save(buffer, format='PNG')
+        response = self.upload('image.png', buffer.getvalue(), 'image/png')
+        self.assertFormError(
+            response, 'form', 'image', 'Поддерживаются форматы: JPEG.')
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=40)
+    def test_large_original_downsized(self):
+        """Большой оригинал уменьшается до POSTS_IMAGE_MAX_SIDE."""
+        self.upload('large.jpg', self.jpeg((100, 50)))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (40, 20))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_inspected_image_is_closed(self):
+        """Открытая для проверки картинка закрывается после формы."""
+        opened = []
+        inspect = uploads.inspect
+
+        def remember(file_):
+            opened.append(inspect(file_))
+            return opened[-1]
+
+        with mock.patch.object(uploads, 'inspect', remember):
+            self.upload('small.jpg', self.jpeg((20, 10)))
+        self.assertTrue(Post.objects.exists())
+        self.assertTrue(opened)
+        self.assertTrue(all(image.fp is None for image in opened))
@@ -0,0 +1,74 @@
+# posts/tests/test_middleware.py
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(PERFORMANCE_SERVER_TIMING=True,
+                   PERFORMANCE_QUERY_BUDGET=None,
+                   PERFORMANCE_LATENCY_BUDGET_MS=None)
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, url):
+        with self.assertLogs('yatube.performance', 'INFO') as logs:
+            response = self.client.get(url)
+        return response, json.loads(logs.records[-1].getMessage()), logs
+
+    def test_metrics_logged_and_sent_as_server_timing(self):
+        """Метрики запроса попадают в лог и в Server-Timing."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response, fields, _ = self.get(url)
+        self.assertEqual(fields['status'], 200)
+        self.assertEqual(fields['path'], url)
+        self.assertGreater(fields['db_queries'], 0)
+        self.assertGreater(fields['template_ms'], 0)
+        self.assertEqual(fields['over_budget'], [])
+        self.assertEqual(fields['nplusone'], [])
+        timing = response['Server-Timing']
+        for name in ('db;dur=', 'cache;desc=', 'tpl;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+        self.assertIn(f'"{fields["db_queries"]} queries"', timing)
+
+    def test_cache_hits_counted(self):
+        """Повторный запрос ленты берет страницу из кеша."""
+        _, cold, _ = self.get(reverse('posts:index'))
+        _, warm, _ = self.get(reverse('posts:index'))
+        self.assertGreater(cold['cache_misses'], 0)
+        self.assertGreater(warm['cache_hits'], cold['cache_hits'])
+        self.assertLess(warm['db_queries'], cold['db_queries'])
+
+    @override_settings(PERFORMANCE_QUERY_BUDGET=0)
+    def test_over_budget_flagged(self):
+        """Запрос сверх бюджета логируется как WARNING."""
+        response, fields, logs = self.get(reverse('posts:index'))
+        self.assertEqual(fields['over_budget'], ['queries'])
+        self.assertEqual(logs.records[-1].levelname, 'WARNING')
+        self.assertIn('budget;desc="queries"', response['Server-Timing'])
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=False)
+    def test_server_timing_can_be_disabled(self):
+        response, _, _ = self.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_metrics_silent_under_tests(self):
+        """В тестах метрики не печатаются, но assertLogs их видит."""
+        logger = logging.getLogger('yatube.performance')
+        self.assertFalse(logger.propagate)
+        self.assertTrue(all(isinstance(handler, logging.NullHandler)
+                            for handler in logger.handlers))
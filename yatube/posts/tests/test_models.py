@@ -1,6 +1,11 @@
+import unittest
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from posts.models import Post, Group
+from posts.models import Post, Group, Comment, Follow, UserStats
 
 User = get_user_model()
 
@@ -59,3 +64,69 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value
                 )
+
+
+class UserStatsModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.for_user(user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_create_and_delete(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        UserStats.objects.for_user(self.user)
+        UserStats.objects.for_user(self.reader)
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.create(author=self.user, text='Пост 2')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertStats(self.user, posts_count=2, followers_count=1)
+        self.assertStats(
+            self.reader, comments_count=1, following_count=1)
+        post.delete()
+        follow.delete()
+        self.assertStats(self.user, posts_count=1, followers_count=0)
+        self.assertStats(
+            self.reader, comments_count=0, following_count=0)
+
+    def test_missing_row_is_recounted(self):
+        """Отсутствующая строка счетчиков создается пересчетом."""
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(3)])
+        self.assertStats(self.user, posts_count=3)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_user_stats исправляет рассинхрон."""
+        UserStats.objects.for_user(self.user)
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'Пост {i}') for i in range(3)])
+        self.assertStats(self.user, posts_count=0)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertStats(self.user, posts_count=3)
+        self.assertStats(self.reader, posts_count=0)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'План запроса SQLite')
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_use_composite_indexes(self):
+        """Запросы лент идут по составным индексам без сортировки."""
+        plans = {
+            'post_date_id': Post.objects.for_feed()[:10],
+            'post_author_date': Post.objects.filter(
+                author_id=1).for_feed()[:10],
+            'post_group_date': Post.objects.filter(
+                group_id=1).for_feed()[:10],
+            'comment_post_created': Comment.objects.filter(post_id=1),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index=index):
+                plan = queryset.explain()
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,64 @@
+# posts/tests/test_nplusone.py
+from django.contrib.auth import get_user_model
+from django.template import Context, Template
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.nplusone import (NPlusOneError, NPlusOneTestMixin, detect,
+                           fingerprint)
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class NPlusOneDetectorTest(NPlusOneTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='group-slug', description='')
+        Post.objects.bulk_create([
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(6)
+        ])
+
+    def test_in_lists_share_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT 1 WHERE id IN (%s, %s)'),
+            fingerprint('SELECT 1 WHERE id IN (%s)'),
+        )
+
+    def test_lazy_foreign_keys_detected_in_code(self):
+        """Ленивая загрузка автора в цикле находится с местом в коде."""
+        with detect(limit=5) as detector:
+            for post in Post.objects.all():
+                post.author.username
+        problems = detector.problems()
+        self.assertEqual(len(problems), 1)
+        self.assertEqual(problems[0]['count'], 6)
+        self.assertIn('posts/tests/test_nplusone.py', problems[0]['code'])
+        self.assertIn('auth_user', problems[0]['sql'])
+
+    def test_template_line_reported(self):
+        """Запрос из шаблона указывает на строку шаблона."""
+        template = Template(
+            '{% for post in posts %}\n'
+            '{{ post.group.title }}\n'
+            '{% endfor %}')
+        with detect(limit=5) as detector:
+            template.render(Context({'posts': Post.objects.all()}))
+        self.assertTrue(detector.problems()[0]['template'].endswith(':2'))
+
+    def test_assertion_fails_on_n_plus_one(self):
+        with self.assertRaisesMessage(NPlusOneError, 'N+1'):
+            with self.assertNoNPlusOne(limit=5):
+                [post.group.slug for post in Post.objects.all()]
+        with self.assertNoNPlusOne(limit=5):
+            [post.group.slug
+             for post in Post.objects.select_related('group')]
+
+    @override_settings(NPLUSONE_RAISE=True)
+    def test_middleware_checks_every_request(self):
+        """Middleware проверяет и реальные страницы."""
+        response = Client().get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
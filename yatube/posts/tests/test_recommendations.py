@@ -0,0 +1,96 @@
+# posts/tests/test_recommendations.py
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follows, recommendations
+from posts.models import Follow, Suggestion
+from posts.tests.utils import on_commit_callbacks
+
+User = get_user_model()
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'star', 'niche', 'fan', 'lonely')
+        }
+        pairs = (
+            ('reader', 'friend'),
+            ('friend', 'star'), ('friend', 'niche'),
+            ('fan', 'friend'), ('fan', 'star'),
+            ('niche', 'star'),
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.users[user], author=cls.users[author])
+            for user, author in pairs)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, user):
+        return [suggestion.author.username for suggestion in
+                Suggestion.objects.filter(user=self.users[user])]
+
+    def test_graph_is_compact(self):
+        """Соседи вершины — срез массива ребер."""
+        graph = recommendations.FollowGraph(
+            Follow.objects.values_list('user_id', 'author_id'))
+        friend = graph.index[self.users['friend'].pk]
+        following = graph.neighbours(graph.following, friend)
+        self.assertEqual(
+            sorted(graph.ids[j] for j in following),
+            sorted([self.users['star'].pk, self.users['niche'].pk]))
+        self.assertEqual(len(graph.following[1]), Follow.objects.count())
+
+    def test_friends_of_friends_first(self):
+        """Авторы моих авторов — выше популярных, свои не предлагаются."""
+        recommendations.rebuild(limit=3)
+        names = self.names('reader')
+        self.assertEqual(names[:2], ['star', 'niche'])
+        self.assertNotIn('friend', names)
+        self.assertNotIn('reader', names)
+        reasons = dict(Suggestion.objects.filter(
+            user=self.users['reader']).values_list(
+                'author__username', 'reason'))
+        self.assertEqual(reasons['star'], Suggestion.FRIENDS)
+
+    def test_cold_start_gets_popular_authors(self):
+        """Тому, кто ни на кого не подписан, — самые читаемые авторы."""
+        recommendations.rebuild(limit=2)
+        self.assertEqual(self.names('lonely'), ['star', 'friend'])
+
+    def test_rebuild_replaces_old_suggestions(self):
+        recommendations.rebuild(limit=3)
+        recommendations.rebuild(limit=1)
+        self.assertEqual(Suggestion.objects.filter(
+            user=self.users['reader']).count(), 1)
+
+    def test_pages_show_suggestions(self):
+        """Профиль и лента подписок показывают рекомендации."""
+        call_command('build_recommendations', stdout=open('/dev/null', 'w'))
+        client = Client()
+        client.force_login(self.users['reader'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [suggestion.author.username
+             for suggestion in response.context['suggestions']][:2],
+            ['star', 'niche'])
+        response = client.get(
+            reverse('posts:profile', args=['star']))
+        self.assertNotIn('star', [
+            suggestion.author.username
+            for suggestion in response.context['suggestions']])
+
+    def test_followed_suggestion_disappears(self):
+        recommendations.rebuild()
+        reader = self.users['reader']
+        with on_commit_callbacks():
+            follows.follow(reader, [self.users['star'].pk])
+        self.assertNotIn('star', [
+            suggestion.author.username
+            for suggestion in recommendations.suggestions_for(reader)])
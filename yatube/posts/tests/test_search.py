@@ -0,0 +1,130 @@
+# posts/tests/test_search.py
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+from posts.stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова сводятся к одной основе."""
+        for forms in (('ваза', 'вазы', 'вазой'),
+                      ('котята', 'котятами'),
+                      ('книга', 'книги', 'книгу')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_non_russian_words_untouched(self):
+        self.assertEqual(stem('Python'), 'python')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.vase = Post.objects.create(
+            author=cls.user, text='Купил новую вазу для цветов')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Котята спят, котята едят')
+        cls.comment = Comment.objects.create(
+            post=cls.cats, author=cls.user, text='Красивая ваза у соседей')
+
+    def test_index_follows_saves_and_deletes(self):
+        """Индекс обновляется при сохранении и удалении."""
+        hits, _ = search.search('вазы')
+        self.assertCountEqual(hits, [
+            (search.POST, self.vase.pk, self.vase.pk),
+            (search.COMMENT, self.comment.pk, self.cats.pk),
+        ])
+        vase = Post.objects.get(pk=self.vase.pk)
+        vase.text = 'Купил новый стол'
+        vase.save()
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(search.search('вазы')[0], [])
+        self.assertEqual(len(search.search('столом')[0]), 1)
+
+    def test_ranked_and_paginated_by_cursor(self):
+        """Результаты по релевантности и листаются курсором."""
+        hits, next_cursor = search.search('котята ваза кот', limit=5)
+        self.assertEqual(hits, [])
+        first, next_cursor = search.search('котята', limit=1)
+        self.assertEqual(first, [(search.POST, self.cats.pk, self.cats.pk)])
+        self.assertIsNone(next_cursor)
+
+        for text in ('Кот', 'Котята, котята и котята', 'котята'):
+            Post.objects.create(author=self.user, text=text)
+        pages, cursor = [], None
+        while True:
+            hits, cursor = search.search('котята', limit=2, cursor=cursor)
+            pages.append(hits)
+            if cursor is None:
+                break
+        found = [hit for page in pages for hit in page]
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len(set(found)), 3)
+        self.assertEqual(
+            Post.objects.get(pk=found[0][1]).text, 'Котята, котята и котята')
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS в запросе не ломают поиск."""
+        self.assertEqual(search.search('NEAR( OR "*')[0], [])
+        self.assertEqual(len(search.search('"ваз*')[0]), 2)
+
+    def test_search_view(self):
+        """Страница поиска показывает посты и комментарии."""
+        response = Client().get(reverse('posts:search'), {'q': 'ваза'})
+        results = response.context['results']
+        self.assertEqual(len(results), 2)
+        self.assertEqual(
+            {result['post'] for result in results}, {self.vase, self.cats})
+        self.assertIn(self.comment, [result['comment'] for result in results])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет через индекс."""
+        self.assertEqual(
+            search.matching_ids(search.COMMENT, 'вазами'), [self.comment.pk])
+        self.assertEqual(
+            search.matching_ids(search.POST, 'вазами'), [self.vase.pk])
+
+    def test_admin_search_is_not_capped(self):
+        """В админке находятся все совпадения, а не первая тысяча."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Ваза {number}')
+            for number in range(1005))
+        search.rebuild(batch_size=300)
+        self.assertEqual(
+            len(search.matching_ids(search.POST, 'ваза')), 1006)
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'ваза'})
+        self.assertEqual(response.context['cl'].result_count, 1006)
+
+    def test_index_all_in_batches(self):
+        """index_all пишет индекс пачками, как rebuild и миграция 0019."""
+        backend_class = type(search.backend())
+        with mock.patch.object(
+                backend_class, 'index', autospec=True,
+                side_effect=backend_class.index) as index:
+            total = search.index_all(
+                Post.objects.all(), Comment.objects.all(), batch_size=1)
+        self.assertEqual(total, 3)
+        self.assertEqual(index.call_count, 3)
+        self.assertEqual(len(search.search('ваза')[0]), 2)
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(search.search('ваза')[0]), 2)
@@ -0,0 +1,140 @@
+# posts/tests/test_storage.py
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import storage, thumbnails, variants
+from posts.models import ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_THUMBNAIL_WORKERS=0,
+    POSTS_IMAGE_WIDTHS=[320],
+)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def age(self, name):
+        """Делает файл старше COLLECT_GRACE."""
+        past = time.time() - storage.COLLECT_GRACE - 1
+        os.utime(storage.image_storage.path(name), (past, past))
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом с именем-хешем."""
+        first = self.create_post('a.gif')
+        second = self.create_post('b.gif')
+        other = self.create_post('c.gif', SMALL_GIF + b'\x00')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{32}\.gif$')
+        self.assertEqual(storage.references(first.image.name), 2)
+
+    def test_duplicates_share_variants(self):
+        """Дубликаты получают уже нарезанные варианты."""
+        first = self.create_post('a.gif')
+        thumbnails.render_thumbnails(first.image.name)
+        second = self.create_post('b.gif')
+        variants.attach([second])
+        self.assertTrue(second.variants)
+
+    def test_collect_waits_for_last_reference(self):
+        """Файл и его производные удаляются вместе с последним постом."""
+        first = self.create_post('a.gif')
+        second = self.create_post('b.gif')
+        name = first.image.name
+        thumbnails.render_thumbnails(name)
+        variant_files = list(ImageVariant.objects.filter(
+            source=name).values_list('image', flat=True))
+
+        first.delete()
+        self.assertFalse(storage.collect(name))
+        self.assertTrue(storage.image_storage.exists(name))
+
+        second.delete()
+        self.age(name)
+        self.assertTrue(storage.collect(name))
+        self.assertFalse(storage.image_storage.exists(name))
+        self.assertFalse(ImageVariant.objects.filter(source=name).exists())
+        self.assertFalse(any(
+            default_storage.exists(variant) for variant in variant_files))
+
+    def test_recent_file_is_not_collected(self):
+        """Только что записанный файл переживает collect."""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        self.assertFalse(storage.collect(name))
+        self.assertTrue(storage.image_storage.exists(name))
+
+    def test_upload_during_collect_keeps_file(self):
+        """Загрузка того же файла посреди collect его сохраняет."""
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        self.age(name)
+        replace = os.replace
+
+        def upload_then_replace(source, target):
+            # Повторная загрузка успела до переноса файла в сторону.
+            storage.image_storage.save(
+                'posts/again.gif', SimpleUploadedFile('again.gif', SMALL_GIF))
+            mock_replace.side_effect = replace
+            replace(source, target)
+
+        with mock.patch.object(
+                storage.os, 'replace',
+                side_effect=upload_then_replace) as mock_replace:
+            self.assertFalse(storage.collect(name))
+        self.assertTrue(storage.image_storage.exists(name))
+
+    def test_collect_images_command(self):
+        """Команда подбирает файлы, пропущенные из-за COLLECT_GRACE."""
+        post = self.create_post()
+        kept = self.create_post('other.gif', SMALL_GIF + b'\x00')
+        name = post.image.name
+        post.delete()
+        self.assertFalse(storage.collect(name))
+        self.age(name)
+        self.age(kept.image.name)
+        call_command('collect_images', stdout=StringIO())
+        self.assertFalse(storage.image_storage.exists(name))
+        self.assertTrue(storage.image_storage.exists(kept.image.name))
@@ -0,0 +1,188 @@
+# posts/tests/test_thumbnails.py
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails, variants
+from posts.models import ImageVariant, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_THUMBNAIL_WORKERS=0,
+    POSTS_IMAGE_WIDTHS=[320, 640],
+)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def render(self, post):
+        return Template('{% load post_images %}{% post_picture post %}'
+                        ).render(Context({'post': post}))
+
+    def test_variants_have_every_width_and_format(self):
+        """Варианты нарезаются во всех ширинах и доступных форматах."""
+        post = self.create_post()
+        count = variants.generate(post.image.name)
+        self.assertEqual(count, 2 * len(variants.formats()))
+        self.assertEqual(
+            sorted(ImageVariant.objects.filter(
+                source=post.image.name, format='jpg').values_list(
+                    'width', 'height')),
+            [(320, 113), (640, 226)],
+        )
+
+    def test_same_content_shares_variant_files(self):
+        """Одинаковые картинки получают одни и те же файлы вариантов."""
+        first, second = self.create_post('a.gif'), self.create_post('b.gif')
+        variants.generate(first.image.name)
+        variants.generate(second.image.name)
+        names = {
+            post.pk: set(ImageVariant.objects.filter(
+                source=post.image.name).values_list('image', flat=True))
+            for post in (first, second)
+        }
+        self.assertEqual(names[first.pk], names[second.pk])
+
+    def test_picture_tag_renders_srcset(self):
+        """Тег post_picture выводит srcset, а до нарезки — заглушку."""
+        post = self.create_post()
+        self.assertIn('thumbnail-pending.svg', self.render(post))
+        variants.generate(post.image.name)
+        post = Post.objects.get(pk=post.pk)
+        html = self.render(post)
+        self.assertIn('320w', html)
+        self.assertIn('640w', html)
+        self.assertIn('sizes="(max-width: 960px) 100vw, 960px"', html)
+        if ('webp', 'WEBP', 'image/webp') in variants.formats():
+            self.assertIn('type="image/webp"', html)
+
+    def test_saved_image_is_scheduled(self):
+        """Сохранение картинки ставит ее в очередь на нарезку."""
+        post = self.create_post()
+        self.assertTrue(cache.get(
+            thumbnails.PENDING_KEY.format(post.image.name)))
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails нарезает варианты всех постов."""
+        post = self.create_post()
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn(
+            f'вариантов: {2 * len(variants.formats())}', out.getvalue())
+        self.assertTrue(ImageVariant.objects.filter(
+            source=post.image.name).exists())
+
+    def test_cached_pages_drop_placeholder_when_ready(self):
+        """Готовые варианты сразу видны на закешированных страницах."""
+        post = self.create_post()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ]
+        for url in urls:
+            self.assertContains(self.client.get(url), 'thumbnail-pending.svg')
+        thumbnails.render_thumbnails(post.image.name)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, 'thumbnail-pending.svg')
+                self.assertContains(response, '320w')
+
+    def test_broken_image_backs_off(self):
+        """Нечитаемая картинка не сбрасывает кеш и ждет повтора."""
+        name = 'posts/missing.jpg'
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Импорт', image=name)])
+        with mock.patch.object(thumbnails, 'pages_changed') as changed, \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            self.assertEqual(thumbnails.render_thumbnails(name), 0)
+            self.assertEqual(thumbnails.render_thumbnails(name), 0)
+        changed.assert_not_called()
+        self.assertEqual(cache.get(thumbnails.FAILED_KEY.format(name)), 2)
+        # отметка держится: страница не ставит картинку снова
+        self.assertFalse(cache.add(thumbnails.PENDING_KEY.format(name), 1))
+
+    def test_rendered_image_does_not_reset_pages_again(self):
+        """Повторная нарезка готовой картинки не трогает кеш страниц."""
+        post = self.create_post()
+        thumbnails.render_thumbnails(post.image.name)
+        with mock.patch.object(thumbnails, 'pages_changed') as changed:
+            self.assertEqual(thumbnails.render_thumbnails(post.image.name), 0)
+        changed.assert_not_called()
+
+    def test_text_edit_does_not_reschedule(self):
+        """Правка текста не ставит картинку в очередь, замена — ставит."""
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post.text = 'Новый текст'
+            post.save()
+            schedule.assert_not_called()
+            post.image = SimpleUploadedFile(
+                'other.gif', SMALL_GIF + b'\x00', 'image/gif')
+            post.save()
+        schedule.assert_called_once_with(post.image.name)
+
+    def test_existing_variant_files_are_not_resized(self):
+        """Ширины, чьи файлы уже есть, не нарезаются заново."""
+        post = self.create_post()
+        variants.generate(post.image.name)
+        ImageVariant.objects.all().delete()
+        with mock.patch.object(
+                variants.ImageOps, 'fit',
+                side_effect=variants.ImageOps.fit) as fit:
+            self.assertEqual(
+                variants.generate(post.image.name),
+                2 * len(variants.formats()))
+        fit.assert_not_called()
+
+    def test_page_variants_resolved_in_one_query(self):
+        """Варианты картинок страницы ищутся одним запросом."""
+        posts = [self.create_post(f'{i}.gif') for i in range(3)]
+        for post in posts:
+            variants.generate(post.image.name)
+        with self.assertNumQueries(1):
+            variants.attach(posts)
+            for post in posts:
+                self.render(post)
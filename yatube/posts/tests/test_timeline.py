@@ -0,0 +1,124 @@
+# posts/tests/test_timeline.py
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+from posts.paginators import CursorPaginator
+
+User = get_user_model()
+
+
+@override_settings(POSTS_TIMELINE=True, POSTS_TIMELINE_LENGTH=5)
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(TimelineTests.reader)
+
+    def follow_page_texts(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков, но не в чужие."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.other, post=post).exists())
+        self.assertEqual(self.follow_page_texts(), ['Пост'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка подтягивает посты автора, отписка убирает их."""
+        for i in range(7):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(self.follow_page_texts()[0], 'Пост 6')
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_page_texts(), [])
+
+    def test_read_uses_entries_not_follow_join(self):
+        """Лента читается из записей, без JOIN с подписками."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                self.follow_page_texts(), ['Пост 2', 'Пост 1', 'Пост 0'])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('JOIN "posts_follow"', sql)
+        self.assertIn('ORDER BY "posts_timelineentry"."pub_date" DESC', sql)
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_posts_merge_with_entries_in_cursor_pages(self):
+        """Курсоры проходят слитую ленту без пропусков и повторов."""
+        star = User.objects.create_user(username='star')
+        Follow.objects.create(user=self.other, author=star)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(6):
+            Post.objects.create(
+                author=star if i % 2 else self.author, text=f'Пост {i}')
+        followed = {self.author.pk, star.pk}
+        paginator = CursorPaginator(
+            timeline.Timeline(self.reader.pk, followed), 2)
+        page_obj = paginator.page(None)
+        seen = [post.text for post in page_obj]
+        while page_obj.has_next():
+            page_obj = paginator.page(page_obj.next_cursor)
+            seen += [post.text for post in page_obj]
+        self.assertEqual(seen, [f'Пост {i}' for i in range(5, -1, -1)])
+        self.assertEqual(paginator.count, 6)
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_authors_are_read_on_demand(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Пост звезды')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page_texts(), ['Пост звезды'])
+
+    def test_fan_out_trims_timelines(self):
+        """Лента не растет дальше POSTS_TIMELINE_LENGTH без команды."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(8)]
+        for user in (self.reader, self.other):
+            self.assertEqual(
+                set(TimelineEntry.objects.filter(
+                    user=user).values_list('post_id', flat=True)),
+                {post.pk for post in posts[3:]},
+            )
+
+    def test_trim_keeps_newest_entries(self):
+        """trim оставляет только самые новые записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(8)]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=self.reader, post=post, pub_date=post.pub_date)
+             for post in posts], ignore_conflicts=True)
+        timeline.trim(self.reader.pk)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.reader).values_list('post_id', flat=True)),
+            {post.pk for post in posts[3:]},
+        )
@@ -0,0 +1,128 @@
+# posts/tests/test_transfer.py
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import search, transfer
+from posts.models import Group, Post, UserStats
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='group-slug', description='')
+
+    def rows(self, count, **extra):
+        return [dict({
+            'author': 'auth',
+            'group': 'group-slug',
+            'text': f'Импортированная ваза {i}',
+            'pub_date': f'2020-01-{i % 28 + 1:02d}T12:00:00+00:00',
+        }, **extra) for i in range(count)]
+
+    def test_import_in_batches(self):
+        """Импорт идет пачками; даты и ссылки сохраняются."""
+        batches = []
+        importer = transfer.Importer(
+            batch_size=10, on_batch=lambda created, _: batches.append(created))
+        self.assertEqual(importer.run(self.rows(25)), 25)
+        self.assertEqual(batches, [10, 20, 25])
+        post = Post.objects.get(text='Импортированная ваза 0')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.author, self.user)
+        self.assertEqual(
+            post.pub_date.isoformat(), '2020-01-01T12:00:00+00:00')
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        """Число запросов зависит от числа пачек, а не строк."""
+        with self.assertNumQueries(14):
+            transfer.Importer(batch_size=100).run(self.rows(10))
+        with self.assertNumQueries(14):
+            transfer.Importer(batch_size=100).run(self.rows(90))
+
+    def test_unknown_references_skipped(self):
+        """Строки с неизвестным автором или группой пропускаются."""
+        importer = transfer.Importer()
+        rows = self.rows(1) + self.rows(1, author='nobody') + self.rows(
+            1, group='nowhere') + self.rows(1, pub_date='вчера')
+        self.assertEqual(importer.run(rows), 1)
+        self.assertEqual([number for number, _ in importer.skipped], [2, 3, 4])
+        self.assertEqual(importer.skipped_count, 3)
+
+    def test_impossible_date_and_bad_text_skipped(self):
+        """Невозможная дата и текст не строкой пропускают строку."""
+        importer = transfer.Importer()
+        rows = self.rows(1, pub_date='2020-13-45T00:00:00') + self.rows(
+            1, text=None) + self.rows(1)
+        self.assertEqual(importer.run(rows), 1)
+        self.assertEqual(importer.skipped, [
+            (1, 'неверная дата'), (2, 'текст не строка')])
+
+    def test_non_object_lines_skipped(self):
+        """Строка NDJSON, которая не объект, пропускается."""
+        source = io.StringIO('[1]\n"текст"\n' + json.dumps(self.rows(1)[0]))
+        importer = transfer.Importer()
+        self.assertEqual(importer.run(transfer.read_rows(source, 'ndjson')), 1)
+        self.assertEqual([number for number, _ in importer.skipped], [1, 2])
+
+    def test_skipped_sample_is_capped(self):
+        """Пропущенные строки считаются, но хранится только образец."""
+        importer = transfer.Importer()
+        importer.run(self.rows(transfer.SKIPPED_SAMPLE + 5, author='nobody'))
+        self.assertEqual(len(importer.skipped), transfer.SKIPPED_SAMPLE)
+        self.assertEqual(
+            importer.skipped_count, transfer.SKIPPED_SAMPLE + 5)
+
+    def test_signals_work_is_done_after_import(self):
+        """Счетчики и поисковый индекс обновляются после импорта."""
+        UserStats.objects.for_user(self.user)
+        transfer.Importer().run(self.rows(3))
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 3)
+        self.assertEqual(len(search.search('вазы')[0]), 3)
+
+    def test_export_import_round_trip(self):
+        """Выгрузка загружается обратно без потерь в обоих форматах."""
+        transfer.Importer().run(self.rows(3))
+        expected = list(transfer.export_rows(Post.objects.all()))
+        for fmt in transfer.FORMATS:
+            with self.subTest(fmt=fmt):
+                handle, path = tempfile.mkstemp()
+                os.close(handle)
+                self.addCleanup(os.remove, path)
+                call_command('export_posts', path, format=fmt,
+                             stderr=io.StringIO())
+                Post.objects.all().delete()
+                call_command('import_posts', path, format=fmt,
+                             stdout=io.StringIO(), stderr=io.StringIO())
+                self.assertEqual(
+                    list(transfer.export_rows(Post.objects.all())), expected)
+
+    def test_export_to_stdout(self):
+        transfer.Importer().run(self.rows(2))
+        out = io.StringIO()
+        call_command('export_posts', stdout=out, stderr=io.StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['author'], 'auth')
+
+    def test_broken_file_reports_progress(self):
+        """Битая строка прерывает импорт, сохраненные пачки остаются."""
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, 'w', encoding='utf-8') as out:
+            for row in self.rows(2):
+                out.write(json.dumps(row) + '\n')
+            out.write('{не json\n')
+        self.addCleanup(os.remove, path)
+        with self.assertRaisesMessage(CommandError, 'после 2 постов'):
+            call_command('import_posts', path, batch_size=2,
+                         stdout=io.StringIO())
+        self.assertEqual(Post.objects.count(), 2)
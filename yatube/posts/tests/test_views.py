@@ -1,6 +1,8 @@
 # posts/tests/test_views.py
 import shutil
 import tempfile
+from unittest import mock
+from urllib.parse import quote
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -10,7 +12,11 @@ from django import forms
 # from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 
-from posts.models import Post, Group, Comment
+from core.nplusone import NPlusOneTestMixin
+from posts.models import Post, Group, Comment, Follow, UserStats
+from posts.cache import get_version, get_versions
+from posts.paginators import (
+    NEXT, CursorPage, CursorPaginator, encode_cursor)
 
 User = get_user_model()
 
@@ -243,6 +249,151 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), 3)
 
 
+class FeedQueriesTest(NPlusOneTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.bulk_create(
+            [Post(
+                author=cls.author,
+                text=f'Тестовый пост {i}',
+                group=cls.group,
+            ) for i in range(15)
+            ])
+        UserStats.objects.rebuild()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(FeedQueriesTest.user)
+        cache.clear()
+
+    def test_feed_queries_do_not_depend_on_posts_per_page(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        # сессия + пользователь + запросы самой ленты; в профиле
+        # и ленте подписок еще рекомендации и подписки зрителя
+        feeds = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': 'group-slug'}): 5,
+            reverse('posts:profile', kwargs={'username': 'author'}): 8,
+            reverse('posts:follow_index'): 6,
+        }
+        for url, queries in feeds.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.authorized_client.get(url)
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.authorized_client.get(url + '?page=2')
+                cache.clear()
+
+    def test_pages_have_no_n_plus_one(self):
+        """Ни одна страница не делает запрос на каждый пост."""
+        post = Post.objects.first()
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.user, text=f'Комментарий {i}')
+            for i in range(10)
+        ])
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with self.assertNoNPlusOne(limit=3):
+                    self.authorized_client.get(url)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            [Post(
+                id=i,
+                author=cls.user,
+                text=f'Тестовый пост {i}',
+            ) for i in range(1, 24)
+            ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры next/prev проходят ленту без пропусков и повторов."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        page_obj = self.client.get(url + '?cursor=').context['page_obj']
+        self.assertFalse(page_obj.has_previous())
+        seen = [post.id for post in page_obj]
+        pages = [page_obj]
+        while page_obj.has_next():
+            page_obj = self.client.get(
+                url, {'cursor': page_obj.next_cursor}).context['page_obj']
+            seen += [post.id for post in page_obj]
+            pages.append(page_obj)
+        self.assertEqual(seen, list(range(23, 0, -1)))
+        self.assertEqual([len(page) for page in pages], [10, 10, 3])
+        back = self.client.get(
+            url, {'cursor': pages[-1].previous_cursor}).context['page_obj']
+        self.assertEqual(
+            [post.id for post in back], [post.id for post in pages[1]])
+
+    def test_cursor_page_does_not_count(self):
+        """Страница курсора — один запрос к постам, без COUNT(*)."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page_obj = paginator.get_page(None)
+        self.assertEqual(len(page_obj), 10)
+
+    def test_cursor_paginator_counts_on_demand(self):
+        """count и num_pages работают, как у Paginator."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 23)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_page_past_end_links_to_first(self):
+        """За концом ленты пусто, но есть ссылка на первую страницу."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        oldest = Post.objects.order_by('pub_date', 'pk').first()
+        past_end = self.client.get(
+            url, {'cursor': encode_cursor(oldest, NEXT)})
+        self.assertEqual(len(past_end.context['page_obj']), 0)
+        self.assertContains(past_end, 'href="?cursor="')
+        first = self.client.get(url, {'cursor': ''})
+        self.assertNotContains(first, 'Первая')
+
+    def test_cursor_links_are_urlencoded(self):
+        """Токен курсора в ссылке экранирован."""
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        page_obj = self.client.get(url, {'cursor': ''}).context['page_obj']
+        response = self.client.get(url, {'cursor': ''})
+        self.assertContains(
+            response, f'?cursor={quote(page_obj.next_cursor)}"')
+
+    def test_broken_cursor_returns_first_page(self):
+        """Подделанный курсор отдает первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'broken:token'})
+        self.assertEqual(response.context['page_obj'][0].id, 23)
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_cursor_mode_from_settings(self):
+        """POSTS_PAGINATION='cursor' включает курсоры по умолчанию."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsInstance(response.context['page_obj'], CursorPage)
+
+
 # @override_settings(CACHES={'default': {
 #     'BACKEND': 'django.core.cache.backends.dummy.DummyCache', }})
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -367,7 +518,8 @@ class CacheViewsTest(TestCase):
     @ classmethod
     def setUpClass(cls):
         super().setUpClass()
-        cls.user = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(
+            username='auth', password='pass')
         cls.group = Group.objects.create(
             title='Тестовая группа1',
             slug='group-slug1',
@@ -400,7 +552,19 @@ class CacheViewsTest(TestCase):
         cache.clear()
 
     def test_cache_records_in_index_page(self):
-        """Проверка кеширования постов на главной странице."""
+        """Главная страница кешируется, пока данные не менялись."""
+        response = self.client.get(reverse('posts:index'))
+        object_index1 = response.content
+        Post.objects.filter(id=1).update(text='Тихая правка')
+        response = self.client.get(reverse('posts:index'))
+        object_index2 = response.content
+        self.assertEqual(object_index1, object_index2)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(object_index1, response.content)
+
+    def test_new_post_invalidates_index_page(self):
+        """Новый пост сразу сбрасывает кеш главной страницы."""
         response = self.client.get(reverse('posts:index'))
         object_index1 = response.content
         Post.objects.create(
@@ -410,15 +574,47 @@ class CacheViewsTest(TestCase):
             group=CacheViewsTest.group,
         )
         response = self.client.get(reverse('posts:index'))
-        object_index2 = response.content
-        self.assertEqual(object_index1, object_index2)
-        cache.clear()
-        # dpost = Post.objects.filter(id=2)
-        # dpost.delete()
-
-        # response = self.client.get(reverse('posts:index'))
-        # object_index3 = response.content
-        # self.assertEqual(object_index1, object_index3)
+        self.assertNotEqual(object_index1, response.content)
+        self.assertIn('Тестовый пост2', response.content.decode())
+
+    def test_group_change_invalidates_index_page(self):
+        """Правка группы сбрасывает кеш главной страницы."""
+        self.client.get(reverse('posts:index'))
+        group = CacheViewsTest.group
+        group.title = 'Новое имя группы'
+        group.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('Новое имя группы', response.content.decode())
+
+    def test_login_does_not_invalidate_index_page(self):
+        """Вход пользователя не сбрасывает кеш главной страницы."""
+        version = get_version('posts')
+        self.client.login(username='auth', password='pass')
+        self.assertEqual(version, get_version('posts'))
+
+    def test_signup_and_password_change_keep_feeds(self):
+        """Новый пользователь и смена пароля не трогают ленты."""
+        versions = get_versions('posts', 'group:group-slug1')
+        user = User.objects.create_user(username='newcomer')
+        user.set_password('secret')
+        user.save()
+        CacheViewsTest.user.set_password('other')
+        CacheViewsTest.user.save()
+        self.assertEqual(versions, get_versions('posts', 'group:group-slug1'))
+
+    def test_rename_invalidates_only_author_pages(self):
+        """Новое имя автора видно в лентах с его постами."""
+        other = Group.objects.create(title='Чужая группа', slug='other')
+        other_page = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'other'})).content
+        self.client.get(reverse('posts:index'))
+        user = User.objects.get(pk=CacheViewsTest.user.pk)
+        user.first_name, user.last_name = 'Новое', 'Имя'
+        user.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+        self.assertEqual(other_page, self.client.get(
+            reverse('posts:group_list', kwargs={'slug': other.slug})).content)
 
 
 class PostCommentsTests(TestCase):
@@ -479,3 +675,60 @@ class PostCommentsTests(TestCase):
         object_comments = response.context['comments']
         first_object_comment = object_comments[0].text
         self.assertEqual(first_object_comment, PostCommentsTests.comment1.text)
+
+
+@mock.patch('posts.utils.COMMENTS_PER_PAGE', 3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(7))
+        cls.texts = list(Comment.objects.order_by(
+            '-created', '-pk').values_list('text', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.detail_url = reverse(
+            'posts:post_detail', args=[CommentPaginationTests.post.pk])
+        self.comments_url = reverse(
+            'posts:comments', args=[CommentPaginationTests.post.pk])
+
+    def test_detail_shows_first_page(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(self.detail_url)
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(texts, CommentPaginationTests.texts[:3])
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_pages_follow_keyset(self):
+        """Курсоры проходят все комментарии без пропусков и повторов."""
+        texts, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get(
+                self.comments_url, {'cursor': cursor, 'format': 'json'}
+            ).json()
+            texts += [comment['text'] for comment in data['comments']]
+            cursor = data['next_cursor']
+        self.assertEqual(texts, CommentPaginationTests.texts)
+
+    def test_fragment_has_load_more_link(self):
+        """HTML-фрагмент содержит ссылку на следующую страницу."""
+        response = self.client.get(self.comments_url)
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'data-fragment=', count=1)
+        self.assertContains(response, CommentPaginationTests.texts[0])
+
+    def test_first_page_cached_until_new_comment(self):
+        """Первая страница берется из кеша, новый комментарий ее сбрасывает."""
+        self.client.get(self.comments_url)
+        with self.assertNumQueries(1):
+            # только сам пост
+            self.client.get(self.comments_url)
+        Comment.objects.create(
+            post=CommentPaginationTests.post,
+            author=CommentPaginationTests.user, text='Свежий комментарий')
+        response = self.client.get(self.comments_url)
+        self.assertContains(response, 'Свежий комментарий')
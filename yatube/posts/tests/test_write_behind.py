@@ -0,0 +1,188 @@
+# posts/tests/test_write_behind.py
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import search, write_behind
+from posts.models import Comment, Post, UserStats
+
+User = get_user_model()
+
+
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Горячий пост')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = override_settings(
+            POSTS_COMMENT_WRITE_BEHIND=True,
+            POSTS_COMMENT_QUEUE=f'{directory}/queue.sqlite3',
+            POSTS_COMMENT_FLUSH_INTERVAL=None,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(write_behind.close)
+        self.reader_client = Client()
+        self.reader_client.force_login(WriteBehindTests.reader)
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def comment(self, text, client=None):
+        return (client or self.reader_client).post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': text})
+
+    def test_comment_is_queued(self):
+        """Комментарий ложится в очередь, а не в базу."""
+        response = self.comment('Отложенный комментарий')
+        self.assertRedirects(response, self.url)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_invalid_comment_is_not_queued(self):
+        self.comment('')
+        self.assertEqual(write_behind.drain(), 0)
+
+    def test_author_sees_own_pending_comment(self):
+        """Свой комментарий из очереди виден сразу, чужим — нет."""
+        self.comment('Отложенный комментарий')
+        self.assertContains(
+            self.reader_client.get(self.url), 'Отложенный комментарий')
+        self.assertNotContains(
+            self.client.get(self.url), 'Отложенный комментарий')
+
+    def test_flush_writes_batches(self):
+        """Перенос пачками обновляет счетчики, поиск и страницу поста."""
+        etag = self.client.get(self.url)['ETag']
+        for i in range(5):
+            self.comment(f'Комментарий про вазу {i}')
+        self.assertEqual(write_behind.flush(batch_size=3), 3)
+        self.assertEqual(write_behind.drain(), 2)
+        self.assertEqual(Comment.objects.count(), 5)
+        stats = UserStats.objects.for_user(WriteBehindTests.reader)
+        self.assertEqual(stats.comments_count, 5)
+        self.assertEqual(len(search.matching_ids(search.COMMENT, 'вазы')), 5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий про вазу 4')
+
+    def test_flushed_comment_not_shown_twice(self):
+        self.comment('Единственный комментарий')
+        write_behind.drain()
+        response = self.reader_client.get(self.url)
+        self.assertContains(response, 'Единственный комментарий', count=1)
+
+    def test_retry_skips_written_comments(self):
+        """Пачка упавшего переноса не пишется второй раз."""
+        self.comment('Уже записанный')
+        self.comment('Еще не записанный')
+        _, rows = write_behind._claim(10)
+        Comment.objects.create(
+            post=WriteBehindTests.post, author=WriteBehindTests.reader,
+            text=rows[0][2], queue_key=rows[0][4])
+        # взятая пачка «зависла»: истекаем ее срок
+        write_behind._queue().execute(
+            'UPDATE comment_queue SET claimed_at = ?',
+            (time.time() - write_behind.CLAIM_TIMEOUT - 1,))
+        write_behind.drain()
+        self.assertEqual(
+            sorted(Comment.objects.values_list('text', flat=True)),
+            ['Еще не записанный', 'Уже записанный'])
+
+    def test_same_text_twice_is_kept(self):
+        """Одинаковые комментарии — разные строки очереди, оба пишутся."""
+        self.comment('+1')
+        self.comment('+1')
+        _, rows = write_behind._claim(10)
+        write_behind._queue().execute(
+            'UPDATE comment_queue SET claimed_at = ?',
+            (time.time() - write_behind.CLAIM_TIMEOUT - 1,))
+        write_behind.drain()
+        self.assertEqual(Comment.objects.filter(text='+1').count(), 2)
+
+    def test_flush_keeps_queue_time(self):
+        """created — время приема комментария, а не переноса."""
+        accepted = timezone.now() - timedelta(minutes=5)
+        write_behind.enqueue(
+            self.post.pk, WriteBehindTests.reader.pk, 'Старый комментарий')
+        write_behind._queue().execute(
+            'UPDATE comment_queue SET created = ?', (accepted.isoformat(),))
+        write_behind.drain()
+        self.assertEqual(Comment.objects.get().created, accepted)
+
+    def test_flush_indexes_only_its_own_comments(self):
+        """Поиск обновляется для перенесенных строк по их ключам."""
+        self.comment('Комментарий про вазу')
+        Comment.objects.create(
+            post=WriteBehindTests.post, author=WriteBehindTests.author,
+            text='Прямая запись про стол')
+        with mock.patch.object(search, 'index') as index:
+            write_behind.drain()
+        indexed = [comment.text for comment in index.call_args[0][0]]
+        self.assertEqual(indexed, ['Комментарий про вазу'])
+
+    def test_old_queue_file_is_upgraded(self):
+        """Очередь без колонки key получает ключи и переносится."""
+        write_behind.close()
+        with sqlite3.connect(settings.POSTS_COMMENT_QUEUE) as conn:
+            conn.execute(
+                'CREATE TABLE comment_queue ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' post_id INTEGER NOT NULL, author_id INTEGER NOT NULL,'
+                ' text TEXT NOT NULL, created TEXT NOT NULL,'
+                ' claimed_by TEXT, claimed_at REAL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0)')
+            conn.execute(
+                'INSERT INTO comment_queue (post_id, author_id, text, created)'
+                ' VALUES (?, ?, ?, ?)',
+                (self.post.pk, WriteBehindTests.reader.pk, 'Из старой очереди',
+                 timezone.now().isoformat()))
+        conn.close()
+        self.assertEqual(write_behind.drain(), 1)
+        self.assertEqual(Comment.objects.get().text, 'Из старой очереди')
+
+    def test_comments_of_deleted_author_are_dropped(self):
+        """Комментарий удаленного автора не останавливает очередь."""
+        ghost = User.objects.create_user(username='ghost')
+        write_behind.enqueue(self.post.pk, ghost.pk, 'От удаленного')
+        ghost.delete()
+        self.comment('Следующий комментарий')
+        self.assertEqual(write_behind.drain(), 2)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Следующий комментарий'])
+
+    def test_comment_to_missing_post_is_rejected(self):
+        """Комментарий к несуществующему посту не ставится в очередь."""
+        response = self.reader_client.post(
+            reverse('posts:add_comment', args=[self.post.pk + 100]),
+            {'text': 'В никуда'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(write_behind.drain(), 0)
+
+    def test_comments_of_deleted_post_are_dropped(self):
+        post = Post.objects.create(
+            author=WriteBehindTests.author, text='Удаляемый пост')
+        write_behind.enqueue(post.pk, WriteBehindTests.reader.pk, 'Текст')
+        post.delete()
+        self.assertEqual(write_behind.drain(), 1)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_command_drains_queue(self):
+        self.comment('Комментарий')
+        call_command('flush_comments', stdout=open('/dev/null', 'w'))
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
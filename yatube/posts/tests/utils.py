@@ -0,0 +1,20 @@
+# posts/tests/utils.py
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def on_commit_callbacks(using=DEFAULT_DB_ALIAS):
+    """Выполняет колбэки transaction.on_commit, отложенные в блоке.
+
+    TestCase не коммитит транзакцию теста, а captureOnCommitCallbacks
+    появился только в Django 3.2.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
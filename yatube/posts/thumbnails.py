@@ -0,0 +1,126 @@
+"""Фоновая подготовка картинок постов.
+
+Варианты srcset (posts.variants), которые выводит тег post_picture,
+нарезаются в пуле процессов сразу после сохранения Post.image, а не
+при первом показе страницы. Пока они не готовы, шаблоны показывают
+заглушку.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import variants
+from .cache import bump_version
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'posts:thumbnail:pending:{}'
+# Через сколько секунд повторить постановку, если воркер не справился.
+PENDING_TIMEOUT = 5 * 60
+# Число неудач подряд для картинки, которую не удалось нарезать
+# (файла нет или он не читается). Повтор — через RETRY_DELAY секунд,
+# после каждой следующей неудачи вдвое позже, но не позже RETRY_MAX_DELAY.
+FAILED_KEY = 'posts:thumbnail:failed:{}'
+RETRY_DELAY = 60
+RETRY_MAX_DELAY = 24 * 60 * 60
+
+_executor = None
+
+
+def render_thumbnails(name):
+    """Нарезает варианты одной картинки.
+
+    Выполняется в процессе пула; возвращает число новых файлов.
+    Кеш страниц сбрасывается, только если что-то появилось: иначе
+    нечитаемая картинка сбрасывала бы его на каждый показ страницы.
+    """
+    try:
+        done = variants.generate(name)
+    except Exception:
+        logger.exception('Не удалось нарезать варианты %s', name)
+        _back_off(name)
+        return 0
+    cache.delete(FAILED_KEY.format(name))
+    cache.delete(PENDING_KEY.format(name))
+    if done:
+        pages_changed(name)
+    return done
+
+
+def _back_off(name):
+    """Оставляет отметку «в очереди», пока не пора повторить."""
+    failures = cache.get(FAILED_KEY.format(name), 0) + 1
+    cache.set(FAILED_KEY.format(name), failures, 2 * RETRY_MAX_DELAY)
+    cache.set(PENDING_KEY.format(name), 1, min(
+        RETRY_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY))
+
+
+def pages_changed(name):
+    """Сбрасывает кеш страниц с картинкой name.
+
+    Ленты и страница поста кешируются до смены версий, а до нарезки
+    в них попала заглушка; варианты готовит этот же шаг.
+    """
+    posts = Post.objects.filter(image=name).values_list(
+        'pk', 'author__username', 'group__slug')
+    names = set()
+    for pk, username, slug in posts:
+        names.update(('posts', f'post:{pk}', f'author:{username}'))
+        if slug:
+            names.add(f'group:{slug}')
+    if names:
+        bump_version(*names)
+
+
+def executor():
+    """Общий пул процессов; None, если POSTS_THUMBNAIL_WORKERS = 0.
+
+    База SQLite в памяти (тесты) другим процессам не видна,
+    поэтому с ней миниатюры тоже готовятся в текущем процессе.
+    """
+    global _executor
+    workers = getattr(settings, 'POSTS_THUMBNAIL_WORKERS', 0)
+    if not workers or (connection.vendor == 'sqlite'
+                       and connection.is_in_memory_db()):
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            # Функция из самого django: модуль с моделями нельзя
+            # импортировать в дочернем процессе до django.setup().
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def _submit(name):
+    global _executor
+    pool = executor()
+    if pool is not None:
+        try:
+            pool.submit(render_thumbnails, name)
+            return
+        except BrokenProcessPool:
+            logger.exception('Пул миниатюр сломан, пересоздаем')
+            _executor = None
+    render_thumbnails(name)
+
+
+def schedule(name):
+    """Ставит картинку в очередь после фиксации транзакции.
+
+    Повторная постановка той же картинки, пока она в работе,
+    ничего не делает.
+    """
+    if not name or not variants.widths():
+        return
+    if cache.add(PENDING_KEY.format(name), 1, PENDING_TIMEOUT):
+        transaction.on_commit(lambda: _submit(name))
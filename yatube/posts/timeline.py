@@ -0,0 +1,171 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации id поста раскладывается в ленты подписчиков автора,
+поэтому follow_index читает готовые записи TimelineEntry по индексу
+timeline_user_date вместо JOIN трех таблиц. Авторы, у которых
+подписчиков больше POSTS_TIMELINE_FANOUT_LIMIT, в ленты
+не раскладываются: их посты подмешиваются при чтении (см. Timeline).
+Длину ленты до POSTS_TIMELINE_LENGTH обрезает сам fan_out; команда
+rebuild_timelines --trim нужна, только если настройку уменьшили.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils.functional import cached_property
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import NEXT
+
+# Сколько подписчиков обрабатывать за один INSERT и одну обрезку.
+FAN_OUT_BATCH = 500
+
+
+def is_enabled():
+    return getattr(settings, 'POSTS_TIMELINE', False)
+
+
+def _length():
+    return getattr(settings, 'POSTS_TIMELINE_LENGTH', 1000)
+
+
+def _fanout_limit():
+    return getattr(settings, 'POSTS_TIMELINE_FANOUT_LIMIT', 10000)
+
+
+def fan_out(post):
+    """Кладет новый пост в ленты подписчиков автора и обрезает их."""
+    stats = UserStats.objects.for_user(post.author)
+    if stats.followers_count > _fanout_limit():
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+    for start in range(0, len(followers), FAN_OUT_BATCH):
+        batch = followers[start:start + FAN_OUT_BATCH]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+             for user_id in batch],
+            ignore_conflicts=True,
+        )
+        trim(*batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('pk', 'pub_date')[:_length()]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def trim(*user_ids):
+    """Оставляет в лентах не больше POSTS_TIMELINE_LENGTH записей.
+
+    Один DELETE на все ленты: номер записи в своей ленте считает
+    оконная функция.
+    """
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('pub_date').desc(), F('pk').desc()],
+        ),
+    ).values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM ({sql}) ranked WHERE position > %s)',
+            (*params, _length()))
+
+
+class Timeline:
+    """Лента подписок user_id для Paginator и CursorPaginator.
+
+    Записи TimelineEntry сортируются по своей pub_date и срезаются
+    по индексу, после чего посты читаются по id. Посты популярных
+    авторов из author_ids (подписки читателя) идут отдельным
+    запросом и сливаются с записями по (pub_date, id).
+    """
+
+    def __init__(self, user_id, author_ids):
+        self.user_id = user_id
+        self.author_ids = author_ids
+
+    @cached_property
+    def popular_ids(self):
+        if not self.author_ids:
+            return []
+        return list(UserStats.objects.filter(
+            user_id__in=self.author_ids,
+            followers_count__gt=_fanout_limit(),
+        ).values_list('user_id', flat=True))
+
+    def _entries(self):
+        return TimelineEntry.objects.filter(user_id=self.user_id)
+
+    def _popular(self):
+        # Записи, оставшиеся с тех пор, как автор не был популярным,
+        # уже есть в ленте: их не нужно читать второй раз.
+        return Post.objects.filter(author_id__in=self.popular_ids).exclude(
+            timeline_entries__user_id=self.user_id)
+
+    def count(self):
+        count = self._entries().count()
+        if self.popular_ids:
+            count += self._popular().count()
+        return count
+
+    def _merge(self, entries, popular, limit, reverse):
+        """Первые limit ключей (pub_date, id) из обоих источников."""
+        keys = list(entries.values_list('pub_date', 'post_id')[:limit])
+        if self.popular_ids:
+            keys += popular.values_list('pub_date', 'pk')[:limit]
+        keys.sort(reverse=reverse)
+        return keys[:limit]
+
+    def _posts(self, keys):
+        posts = Post.objects.for_feed().in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
+
+    def __getitem__(self, index):
+        """Срез ленты, новые сверху; так его берет Paginator."""
+        keys = self._merge(
+            self._entries().order_by('-pub_date', '-post_id'),
+            self._popular().order_by('-pub_date', '-pk'),
+            index.stop, reverse=True)
+        return self._posts(keys[index])
+
+    def keyset(self, decoded, limit):
+        """Строки для CursorPaginator: limit постов после позиции."""
+        entries, popular = self._entries(), self._popular()
+        direction = decoded[0] if decoded else NEXT
+        if decoded is not None:
+            _, moment, pk = decoded
+            lookup = 'lt' if direction == NEXT else 'gt'
+            entries = entries.filter(
+                Q(**{f'pub_date__{lookup}': moment})
+                | Q(**{'pub_date': moment, f'post_id__{lookup}': pk}))
+            popular = popular.filter(
+                Q(**{f'pub_date__{lookup}': moment})
+                | Q(**{'pub_date': moment, f'pk__{lookup}': pk}))
+        if direction == NEXT:
+            keys = self._merge(
+                entries.order_by('-pub_date', '-post_id'),
+                popular.order_by('-pub_date', '-pk'), limit, reverse=True)
+        else:
+            keys = self._merge(
+                entries.order_by('pub_date', 'post_id'),
+                popular.order_by('pub_date', 'pk'), limit, reverse=False)
+        return self._posts(keys)
@@ -0,0 +1,202 @@
+"""Массовый импорт и экспорт постов в NDJSON и CSV.
+
+Строки читаются и пишутся потоком, так что память не зависит
+от размера файла. Импорт идет через bulk_create пачками, каждая
+пачка — своя транзакция; авторы и группы ищутся по словарям,
+загруженным один раз. bulk_create не шлет сигналов, поэтому
+счетчики, поисковый индекс, ленты и кеш обновляет finish.
+"""
+import csv
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import search, timeline
+from .cache import bump_version
+from .models import Follow, Group, Post, UserStats
+from .utils import explicit_dates
+
+User = get_user_model()
+
+FIELDS = ('author', 'group', 'text', 'pub_date', 'image')
+FORMATS = ('ndjson', 'csv')
+# Сколько пропущенных строк Importer запоминает для отчета.
+SKIPPED_SAMPLE = 20
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Словари постов для экспорта, без загрузки всей выборки."""
+    rows = queryset.order_by('pk').values_list(
+        'author__username', 'group__slug', 'text', 'pub_date', 'image')
+    for author, group, text, pub_date, image in rows.iterator(
+            chunk_size=chunk_size):
+        yield {
+            'author': author,
+            'group': group or '',
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'image': image or '',
+        }
+
+
+def write_rows(rows, out, fmt):
+    """Пишет строки в out; возвращает их число."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def read_rows(source, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(source)
+        return
+    for line in source:
+        if line.strip():
+            yield json.loads(line)
+
+
+def parse_pub_date(value):
+    """Дата публикации из строки; без нее — сейчас, неверная — None."""
+    if not value:
+        return timezone.now()
+    try:
+        pub_date = parse_datetime(str(value))
+    except ValueError:
+        # Верный формат с невозможной датой, например 2020-13-45.
+        return None
+    if pub_date is not None and timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+class Importer:
+    """Создает посты из строк пачками по batch_size.
+
+    Строки с неизвестным автором или группой пропускаются: их число
+    в skipped_count, первые SKIPPED_SAMPLE с номерами строк — в skipped.
+    """
+
+    def __init__(self, batch_size=1000, on_batch=None):
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.created = 0
+        self.skipped = []
+        self.skipped_count = 0
+        self.per_author = {}
+        self.group_ids = set()
+        self.started = time.monotonic()
+        self.first_pk = (Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0) + 1
+
+    def skip(self, number, reason):
+        self.skipped_count += 1
+        if len(self.skipped) < SKIPPED_SAMPLE:
+            self.skipped.append((number, reason))
+
+    def build(self, number, row):
+        if not isinstance(row, dict):
+            self.skip(number, 'не объект JSON')
+            return None
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            self.skip(number, 'неизвестный автор')
+            return None
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                self.skip(number, 'неизвестная группа')
+                return None
+        text = row.get('text', '')
+        if not isinstance(text, str):
+            self.skip(number, 'текст не строка')
+            return None
+        pub_date = parse_pub_date(row.get('pub_date'))
+        if pub_date is None:
+            self.skip(number, 'неверная дата')
+            return None
+        return Post(author_id=author_id, group_id=group_id,
+                    text=text, pub_date=pub_date,
+                    image=row.get('image') or '')
+
+    def flush(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            Post.objects.bulk_create(batch)
+        self.created += len(batch)
+        for post in batch:
+            self.per_author[post.author_id] = self.per_author.get(
+                post.author_id, 0) + 1
+            self.group_ids.add(post.group_id)
+        if self.on_batch is not None:
+            self.on_batch(self.created, self.throughput())
+
+    def run(self, rows):
+        batch = []
+        try:
+            with explicit_dates(Post._meta.get_field('pub_date')):
+                for number, row in enumerate(rows, 1):
+                    post = self.build(number, row)
+                    if post is not None:
+                        batch.append(post)
+                    if len(batch) == self.batch_size:
+                        self.flush(batch)
+                        batch = []
+                self.flush(batch)
+        finally:
+            # Уже записанные пачки остаются и при ошибке в файле.
+            self.finish()
+        return self.created
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.created / elapsed if elapsed else 0.0
+
+    def finish(self):
+        """То, что для одиночного поста делают сигналы."""
+        if not self.created:
+            return
+        with transaction.atomic():
+            for author_id, count in self.per_author.items():
+                UserStats.objects.increment(author_id, 'posts_count', count)
+        imported = Post.objects.filter(pk__gte=self.first_pk).order_by('pk')
+        batch = []
+        for post in imported.only('text').iterator(
+                chunk_size=self.batch_size):
+            batch.append(post)
+            if len(batch) == self.batch_size:
+                search.index(batch)
+                batch = []
+        search.index(batch)
+
+        follows = Follow.objects.filter(author_id__in=self.per_author)
+        if timeline.is_enabled():
+            for user_id, author_id in follows.values_list(
+                    'user_id', 'author_id').iterator():
+                timeline.backfill(user_id, author_id)
+        usernames = User.objects.filter(
+            pk__in=self.per_author).values_list('username', flat=True)
+        slugs = Group.objects.filter(
+            pk__in=self.group_ids - {None}).values_list('slug', flat=True)
+        bump_version(
+            'posts',
+            *(f'author:{username}' for username in usernames),
+            *(f'group:{slug}' for slug in slugs),
+            *(f'author_feed:{author_id}' for author_id in self.per_author),
+        )
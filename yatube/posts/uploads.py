@@ -0,0 +1,134 @@
+"""Потоковая загрузка и проверка картинок постов.
+
+Загрузка пишется во временный файл кусками и не держится в памяти;
+при проверке Pillow читает только заголовок картинки. Слишком
+большие файлы и «бомбы» отклоняются до декодирования пикселей,
+а огромные оригиналы уменьшаются до POSTS_IMAGE_MAX_SIDE.
+"""
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+MB = 1024 * 1024
+
+
+def max_upload_size():
+    return getattr(settings, 'POSTS_IMAGE_MAX_UPLOAD_SIZE', 10 * MB)
+
+
+def max_pixels():
+    return getattr(settings, 'POSTS_IMAGE_MAX_PIXELS', 40_000_000)
+
+
+def max_side():
+    return getattr(settings, 'POSTS_IMAGE_MAX_SIDE', None)
+
+
+def allowed_formats():
+    return getattr(settings, 'POSTS_IMAGE_FORMATS',
+                   ('JPEG', 'PNG', 'GIF', 'WEBP'))
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, который обработчик загрузки не стал дописывать.
+
+    Попадает в request.FILES вместо обрезанного файла, чтобы форма
+    показала ошибку, а не сохранила пост без картинки.
+    """
+
+    def __init__(self, name, content_type, size):
+        super().__init__(io.BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Перестает принимать файл, как только он превысил лимит.
+
+    Ставится первым в FILE_UPLOAD_HANDLERS: пока файл в пределах
+    лимита, куски уходят следующему обработчику (временный файл),
+    после — отбрасываются, а досчитывается только размер.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received > max_upload_size():
+            return RejectedUpload(
+                self.file_name, self.content_type, self.received)
+        return None
+
+
+def too_large_message():
+    return f'Файл больше {filesizeformat(max_upload_size())}.'
+
+
+def inspect(file_):
+    """Открывает картинку по заголовку, не декодируя пиксели.
+
+    Бросает ValueError с текстом для пользователя; для файла
+    на диске Pillow читает его по пути, а не копирует в память.
+    Открытую картинку закрывает вызывающий: with inspect(...) as image.
+    """
+    if file_.size > max_upload_size():
+        raise ValueError(too_large_message())
+    if hasattr(file_, 'temporary_file_path'):
+        source = file_.temporary_file_path()
+    else:
+        file_.seek(0)
+        source = file_
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError:
+        raise ValueError('Слишком большое разрешение картинки.')
+    except Exception:
+        raise ValueError('Загрузите правильное изображение.')
+    width, height = image.size
+    if image.format not in allowed_formats():
+        image.close()
+        raise ValueError(
+            'Поддерживаются форматы: ' + ', '.join(allowed_formats()) + '.')
+    if width * height > max_pixels():
+        image.close()
+        raise ValueError('Слишком большое разрешение картинки.')
+    return image
+
+
+def downsize(file_, image):
+    """Уменьшает оригинал до POSTS_IMAGE_MAX_SIDE по большей стороне.
+
+    Возвращает новый временный файл или исходный, если уменьшать
+    нечего. Анимированные картинки не трогает.
+    """
+    limit = max_side()
+    if (not limit or max(image.size) <= limit
+            or getattr(image, 'is_animated', False)):
+        return file_
+    image_format = image.format
+    # Для JPEG декодер сразу масштабирует в 2–8 раз: в память
+    # не попадает полноразмерный растр.
+    image.draft('RGB', (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+
+    # Безымянный временный файл: хранилище скопирует его кусками,
+    # а сам он удалится при закрытии.
+    resized = UploadedFile(
+        tempfile.TemporaryFile(), file_.name, file_.content_type,
+        charset=file_.charset)
+    options = {'quality': 90} if image_format == 'JPEG' else {}
+    image.save(resized, format=image_format, **options)
+    resized.size = resized.tell()
+    resized.seek(0)
+    return resized
@@ -0,0 +1,105 @@
+import copy
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from core.cache import get_or_compute
+
+from . import variants
+from .cache import comment_versions, get_versions
+from .models import Post
+from .paginators import CursorPaginator
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COMMENTS_KEY = 'posts:comments:{}'
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет bulk_create сохранить заданные даты auto_now_add полей."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _page(request, post_list, per_page):
+    cursor = request.GET.get('cursor')
+    mode = getattr(settings, 'POSTS_PAGINATION', 'page')
+    if cursor is not None or (
+            mode == 'cursor' and 'page' not in request.GET):
+        page_obj = CursorPaginator(post_list, per_page).get_page(cursor)
+    else:
+        paginator = Paginator(post_list, per_page)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = list(page_obj.object_list)
+    return page_obj
+
+
+def _attach(page_obj):
+    variants.attach(page_obj.object_list)
+    return page_obj
+
+
+def paginate(request, post_list, per_page=POSTS_PER_PAGE):
+    """Возвращает страницу ленты постов для шаблона.
+
+    Параметр ?cursor= (или POSTS_PAGINATION = 'cursor' в настройках)
+    включает keyset-пагинацию, иначе работает обычная ?page=.
+    Варианты картинок страницы разрешаются пачкой.
+    """
+    return _attach(_page(request, post_list, per_page))
+
+
+def paginate_ids(request, post_list, key, version, per_page=POSTS_PER_PAGE):
+    """paginate, у которого в кеше лежит только выбор постов.
+
+    Под ключом key и версией version хранятся id постов страницы
+    и ее навигация, а сами посты читаются по id одним запросом.
+    Поэтому правка поста видна сразу, и сбрасывать кеш нужно,
+    только когда пост появляется на странице или исчезает с нее.
+    """
+    fresh = []
+
+    def compute():
+        page_obj = _page(request, post_list, per_page)
+        fresh.append(page_obj)
+        stored = copy.copy(page_obj)
+        stored.object_list = [post.pk for post in page_obj.object_list]
+        # count и num_pages уже посчитаны и остаются в копии.
+        stored.paginator = copy.copy(page_obj.paginator)
+        stored.paginator.object_list = None
+        return stored
+
+    page_obj = get_or_compute(key, compute, version=version)
+    if fresh:
+        return _attach(fresh[0])
+    posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts]
+    return _attach(page_obj)
+
+
+def comments_page(post, cursor=None, per_page=None):
+    """Страница комментариев поста, новые сверху: (список, курсор).
+
+    Keyset по (created, id); первая страница кешируется до смены
+    версии комментариев поста.
+    """
+    def compute():
+        page_obj = CursorPaginator(
+            post.comments.select_related('author'),
+            per_page or COMMENTS_PER_PAGE,
+            field='created').get_page(cursor)
+        return list(page_obj.object_list), page_obj.next_cursor
+
+    if cursor:
+        return compute()
+    return get_or_compute(
+        COMMENTS_KEY.format(post.pk), compute,
+        version=get_versions(*comment_versions(post.pk)))
@@ -0,0 +1,116 @@
+"""Адаптивные варианты картинок постов для srcset.
+
+Каждая картинка нарезается в нескольких ширинах (POSTS_IMAGE_WIDTHS)
+с пропорциями 960x339 и сохраняется в JPEG и, если Pillow собран
+с его поддержкой, в WebP. Имена файлов содержат хеш оригинала:
+варианты неизменяемы и кешируются браузером навсегда.
+Генерацию запускает фоновый пул из posts.thumbnails.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import ImageVariant
+from .storage import image_storage
+
+ASPECT = 339 / 960
+QUALITY = 80
+VARIANT_NAME = 'posts/variants/{}-{}.{}'
+# Расширение файла и формат Pillow; порядок — от лучшего сжатия.
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+
+def widths():
+    return getattr(settings, 'POSTS_IMAGE_WIDTHS', [])
+
+
+def formats():
+    """Форматы, которые умеет сохранять установленный Pillow."""
+    return [fmt for fmt in FORMATS
+            if fmt[1] != 'WEBP' or features.check('webp')]
+
+
+def generate(name):
+    """Нарезает варианты картинки name; возвращает число новых.
+
+    Уже записанные в ImageVariant варианты не считаются: 0 значит,
+    что страницы с картинкой обновлять незачем.
+    """
+    if not widths():
+        return 0
+    existing = set(ImageVariant.objects.filter(source=name).values_list(
+        'width', 'format'))
+    with image_storage.open(name) as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    original = None
+
+    variants = []
+    for width in widths():
+        height = round(width * ASPECT)
+        names = {extension: VARIANT_NAME.format(digest, width, extension)
+                 for extension, _, _ in formats()}
+        missing = [(extension, pil_format)
+                   for extension, pil_format, _ in formats()
+                   if not default_storage.exists(names[extension])]
+        if missing:
+            # Оригинал декодируется, только если есть что нарезать.
+            if original is None:
+                original = ImageOps.exif_transpose(
+                    Image.open(io.BytesIO(data))).convert('RGB')
+            fitted = ImageOps.fit(original, (width, height), Image.LANCZOS)
+            for extension, pil_format in missing:
+                buffer = io.BytesIO()
+                fitted.save(buffer, format=pil_format, quality=QUALITY)
+                default_storage.save(
+                    names[extension], ContentFile(buffer.getvalue()))
+        for extension, variant_name in names.items():
+            if (width, extension) not in existing:
+                variants.append(ImageVariant(
+                    source=name, width=width, height=height,
+                    format=extension, image=variant_name))
+    ImageVariant.objects.bulk_create(variants, ignore_conflicts=True)
+    return len(variants)
+
+
+def attach(posts):
+    """Разрешает варианты картинок всех постов страницы одним запросом.
+
+    Кладет в post.variants список ImageVariant (пустой, пока они
+    не нарезаны); его читает тег post_picture.
+    """
+    names = {post.image.name for post in posts if post.image}
+    found = {}
+    if names:
+        for variant in ImageVariant.objects.filter(source__in=names):
+            found.setdefault(variant.source, []).append(variant)
+    for post in posts:
+        post.variants = found.get(post.image.name, []) if post.image else []
+
+
+def srcsets(variants):
+    """srcset по форматам: [(mime, srcset)] кроме JPEG, JPEG и его максимум.
+
+    JPEG остается в самом <img> как запасной вариант.
+    """
+    by_format = {}
+    for variant in variants:
+        by_format.setdefault(variant.format, []).append(variant)
+
+    def srcset(extension):
+        return ', '.join(f'{variant.image.url} {variant.width}w'
+                         for variant in by_format.get(extension, []))
+
+    sources = [(mime, srcset(extension))
+               for extension, _, mime in FORMATS
+               if extension != 'jpg' and extension in by_format]
+    fallback = max(by_format.get('jpg', []),
+                   key=lambda variant: variant.width, default=None)
+    return sources, srcset('jpg'), fallback
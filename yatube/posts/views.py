@@ -1,33 +1,41 @@
-from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import get_user_model
-from .models import Post, Group, Follow
+from .models import Post, Group, UserStats, Comment
 from .forms import PostForm, CommentForm
+from .utils import POSTS_PER_PAGE, comments_page, paginate, paginate_ids
+from . import follows, recommendations, search, timeline, write_behind
 from django.shortcuts import redirect
+from django.http import Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 # from django.shortcuts import get_list_or_404
-from django.views.decorators.cache import cache_page
+from .cache import (INDEX_FEED, cache_feed, get_versions, index_versions,
+                    group_versions, profile_versions, follow_versions,
+                    post_versions, comment_versions, detail_etag,
+                    detail_last_modified, page_key)
 
 
 User = get_user_model()
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_feed(index_versions)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {'page_obj': page_obj, }
+    post_list = Post.objects.for_feed()
+    page_obj = paginate(request, post_list)
+    context = {
+        'page_obj': page_obj,
+        # фрагмент ленты общий для всех зрителей
+        'feed_version': get_versions(*INDEX_FEED),
+    }
     return render(request, 'posts/index.html', context)
 
 
+@cache_feed(group_versions)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page_obj = paginate(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,49 +43,73 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_feed(profile_versions)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     # posts = Post.objects.select_related('author').all()
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    if request.user.is_authenticated:
-        if Follow.objects.filter(user=request.user, author=author):
-            context = {
-                'page_obj': page_obj,
-                'author': author,
-                'following': True,
-            }
-        else:
-            context = {
-                'page_obj': page_obj,
-                'author': author,
-                'following': False,
-            }
-    else:
-        context = {
-            'page_obj': page_obj,
-            'author': author,
-            'following': False,
-        }
+    post_list = author.posts.for_feed()
+    page_obj = paginate(request, post_list)
+    following = follows.is_following(request.user, author.pk)
+    context = {
+        'page_obj': page_obj,
+        'author': author,
+        'author_stats': UserStats.objects.for_user(author),
+        'following': following,
+        'suggestions': recommendations.suggestions_for(
+            request.user, exclude={author.pk}),
+    }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    # comments = Comment.objects.filter(post=post)
-    comments = post.comments.select_related('author').all()
-    # comments = get_object_or_404(Comment, post=post)
-    # comments = get_list_or_404(Comment, post=post)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id)
+    cursor = request.GET.get('cursor')
+    comments, next_cursor = comments_page(post, cursor)
+    pending_comments = []
+    if (write_behind.is_enabled() and not cursor
+            and request.user.is_authenticated):
+        pending_comments = write_behind.pending(
+            post, request.user, comments)
     form = CommentForm()
     context = {'post': post,
+               # счетчики нужны только при пересчете фрагмента
+               'author_stats': lambda: UserStats.objects.for_user(
+                   post.author),
                'comments': comments,
+               'next_cursor': next_cursor,
+               'pending_comments': pending_comments,
+               'post_version': get_versions(*post_versions(
+                   post.pk, post.author.username)),
+               'comments_version': get_versions(*comment_versions(post.pk)),
                'form': form,
                }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующие страницы комментариев: HTML-фрагмент или ?format=json."""
+    post = get_object_or_404(Post, pk=post_id)
+    comments, next_cursor = comments_page(post, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': next_cursor,
+        })
+    context = {'post': post, 'comments': comments, 'next_cursor': next_cursor}
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     if request.method == 'POST':
@@ -122,8 +154,39 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    hits, next_cursor = search.search(
+        query, POSTS_PER_PAGE, request.GET.get('cursor'))
+    posts = Post.objects.for_feed().in_bulk(
+        {post_id for _, _, post_id in hits})
+    comments = Comment.objects.select_related('author').in_bulk(
+        [pk for kind, pk, _ in hits if kind == search.COMMENT])
+    results = [
+        {'post': posts[post_id], 'comment': comments.get(pk)
+         if kind == search.COMMENT else None}
+        for kind, pk, post_id in hits if post_id in posts
+    ]
+    context = {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
+    if write_behind.is_enabled():
+        # Сам пост не нужен, но несуществующему комментарии не копим.
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
+        form = CommentForm(request.POST or None)
+        if form.is_valid():
+            write_behind.enqueue(
+                post_id, request.user.pk, form.cleaned_data['text'])
+        return redirect('posts:post_detail', post_id=post_id)
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     # if request.user != post.author:
@@ -138,11 +201,20 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {'page_obj': page_obj, }
+    following = follows.following_ids(request.user.pk)
+    if timeline.is_enabled():
+        post_list = timeline.Timeline(request.user.pk, following)
+    else:
+        post_list = Post.objects.filter(
+            author__following__user=request.user).for_feed()
+    versions = follow_versions(request.user.pk, following)
+    page_obj = paginate_ids(
+        request, post_list, page_key(request, 'follow_index'),
+        get_versions(*versions))
+    context = {
+        'page_obj': page_obj,
+        'suggestions': recommendations.suggestions_for(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
@@ -158,19 +230,34 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if request.user == author:
-        return redirect('posts:profile', username=username)
-    if not Follow.objects.filter(user=request.user, author=author):
-        Follow.objects.create(author=author, user=request.user)
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    follows.follow(request.user, [author_id])
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    # Дизлайк, отписка
-    author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user, author=author):
-        fordel = Follow.objects.get(author=author, user=request.user)
-        fordel.delete()
-    return redirect('posts:profile', author)
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    follows.unfollow(request.user, [author_id])
+    return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Подписка или отписка от нескольких авторов: POST username=...&..."""
+    action = request.POST.get('action')
+    if action not in ('follow', 'unfollow'):
+        return JsonResponse(
+            {'error': 'action должен быть follow или unfollow'}, status=400)
+    usernames = request.POST.getlist('username')
+    authors = dict(User.objects.filter(
+        username__in=usernames).values_list('pk', 'username'))
+    change = follows.follow if action == 'follow' else follows.unfollow
+    changed = change(request.user, authors)
+    return JsonResponse({
+        'changed': sorted(authors[pk] for pk in changed),
+        'unknown': sorted(set(usernames) - set(authors.values())),
+    })
@@ -0,0 +1,244 @@
+"""Отложенная запись комментариев для горячих постов.
+
+С POSTS_COMMENT_WRITE_BEHIND add_comment не пишет в основную базу:
+проверенный комментарий ложится в локальную очередь — отдельный
+файл SQLite (POSTS_COMMENT_QUEUE), так что всплеск комментариев
+не борется за блокировку записи основной базы. Фоновый поток
+процесса раз в POSTS_COMMENT_FLUSH_INTERVAL секунд переносит очередь
+пачками по POSTS_COMMENT_BATCH_SIZE одним bulk_create; счетчики,
+поиск и кеш, которые для одиночного комментария обновляют сигналы,
+обновляет flush. Пока комментарий в очереди, автор видит его сам
+(pending), остальные — после переноса.
+
+Пачка сначала помечается как взятая; если процесс упал посреди
+переноса, через CLAIM_TIMEOUT ее возьмет другой. У каждой строки
+очереди свой ключ, он сохраняется в Comment.queue_key: комментарии,
+записанные упавшей попыткой, находятся по нему и второй раз
+не пишутся.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import search
+from .cache import bump_version
+from .models import Comment, Post, UserStats
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Сколько секунд взятая пачка считается в работе.
+CLAIM_TIMEOUT = 60
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS comment_queue ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' post_id INTEGER NOT NULL,'
+    ' author_id INTEGER NOT NULL,'
+    ' text TEXT NOT NULL,'
+    ' created TEXT NOT NULL,'
+    ' key TEXT,'
+    ' claimed_by TEXT,'
+    ' claimed_at REAL)',
+    'CREATE INDEX IF NOT EXISTS comment_queue_post_author'
+    ' ON comment_queue (post_id, author_id)',
+)
+
+_local = threading.local()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'POSTS_COMMENT_WRITE_BEHIND', False)
+
+
+def _batch_size():
+    return getattr(settings, 'POSTS_COMMENT_BATCH_SIZE', 500)
+
+
+def _queue():
+    """Соединение потока с файлом очереди."""
+    path = settings.POSTS_COMMENT_QUEUE
+    connections = _local.__dict__.setdefault('connections', {})
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = wal')
+        # Очередь — единственная копия принятого комментария.
+        conn.execute('PRAGMA synchronous = full')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        _upgrade(conn)
+        connections[path] = conn
+    return conn
+
+
+def _upgrade(conn):
+    """Ключи для строк очереди, созданной до появления колонки key."""
+    columns = {row[1] for row in conn.execute(
+        'PRAGMA table_info(comment_queue)')}
+    if 'key' not in columns:
+        conn.execute('ALTER TABLE comment_queue ADD COLUMN key TEXT')
+    conn.execute(
+        'UPDATE comment_queue SET key = lower(hex(randomblob(16))) '
+        'WHERE key IS NULL')
+
+
+def close():
+    """Закрывает соединения текущего потока с очередью."""
+    for conn in _local.__dict__.pop('connections', {}).values():
+        conn.close()
+
+
+def enqueue(post_id, author_id, text):
+    """Ставит комментарий в очередь и будит перенос."""
+    _queue().execute(
+        'INSERT INTO comment_queue (post_id, author_id, text, created, key) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (post_id, author_id, text, timezone.now().isoformat(),
+         uuid.uuid4().hex))
+    # Страница поста у автора должна показать комментарий сразу.
+    bump_version(f'comments:{post_id}')
+    start()
+
+
+def pending(post, user, comments=()):
+    """Комментарии user к post, еще не перенесенные в базу.
+
+    Уже выведенные comments (перенос мог случиться только что)
+    повторно не попадают.
+    """
+    rows = _queue().execute(
+        'SELECT text, created FROM comment_queue '
+        'WHERE post_id = ? AND author_id = ? ORDER BY id DESC',
+        (post.pk, user.pk)).fetchall()
+    shown = {(comment.author_id, comment.text): comment.created
+             for comment in comments}
+    result = []
+    for text, created in rows:
+        created = parse_datetime(created)
+        seen = shown.get((user.pk, text))
+        if seen is not None and seen >= created:
+            continue
+        result.append(Comment(
+            post=post, author=user, text=text, created=created))
+    return result
+
+
+def _claim(limit):
+    owner = uuid.uuid4().hex
+    now = time.time()
+    queue = _queue()
+    queue.execute(
+        'UPDATE comment_queue SET claimed_by = ?, claimed_at = ? '
+        'WHERE id IN (SELECT id FROM comment_queue'
+        ' WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?)',
+        (owner, now, now - CLAIM_TIMEOUT, limit))
+    rows = queue.execute(
+        'SELECT post_id, author_id, text, created, key '
+        'FROM comment_queue WHERE claimed_by = ? ORDER BY id',
+        (owner,)).fetchall()
+    return owner, rows
+
+
+def flush(batch_size=None):
+    """Переносит одну пачку очереди в базу; возвращает размер пачки."""
+    owner, rows = _claim(batch_size or _batch_size())
+    if not rows:
+        return 0
+    with transaction.atomic():
+        # Комментарии к удаленным постам и от удаленных пользователей
+        # отбрасываются: иначе FOREIGN KEY откатил бы всю пачку,
+        # и очередь встала бы на ней навсегда.
+        alive = set(Post.objects.filter(
+            pk__in={row[0] for row in rows}).values_list('pk', flat=True))
+        authors = set(User.objects.filter(
+            pk__in={row[1] for row in rows}).values_list('pk', flat=True))
+        written = set(Comment.objects.filter(
+            queue_key__in=[row[4] for row in rows]).values_list(
+                'queue_key', flat=True))
+        accepted = {key: parse_datetime(created)
+                    for _, _, _, created, key in rows}
+        comments = [
+            Comment(post_id=post_id, author_id=author_id, text=text,
+                    queue_key=key)
+            for post_id, author_id, text, _, key in rows
+            if post_id in alive and author_id in authors
+            and key not in written
+        ]
+        Comment.objects.bulk_create(comments)
+        flushed = Comment.objects.filter(
+            queue_key__in=[comment.queue_key for comment in comments])
+        if comments:
+            # created — auto_now_add, и bulk_create ставит время переноса:
+            # возвращаем время, когда комментарий приняла очередь.
+            flushed.update(created=Case(
+                *(When(queue_key=comment.queue_key, then=Value(
+                    accepted[comment.queue_key],
+                    output_field=DateTimeField()))
+                  for comment in comments),
+                default='created',
+            ))
+        per_author = {}
+        for comment in comments:
+            per_author[comment.author_id] = per_author.get(
+                comment.author_id, 0) + 1
+        for author_id, count in per_author.items():
+            UserStats.objects.increment(author_id, 'comments_count', count)
+        search.index(list(flushed.only('text', 'post_id')))
+    _queue().execute(
+        'DELETE FROM comment_queue WHERE claimed_by = ?', (owner,))
+    bump_version(*{f'comments:{comment.post_id}' for comment in comments})
+    return len(rows)
+
+
+def drain():
+    """Переносит всю очередь; возвращает число перенесенных строк."""
+    total = 0
+    while True:
+        done = flush()
+        total += done
+        if not done:
+            return total
+
+
+def _run(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            drain()
+        except Exception:
+            logger.exception('Не удалось перенести комментарии из очереди')
+        finally:
+            close_old_connections()
+
+
+def start():
+    """Запускает фоновый перенос процесса, если он еще не запущен.
+
+    Без POSTS_COMMENT_FLUSH_INTERVAL (и с базой SQLite в памяти,
+    которую другой поток не видит) очередь переносит только
+    команда flush_comments.
+    """
+    global _flusher
+    interval = getattr(settings, 'POSTS_COMMENT_FLUSH_INTERVAL', None)
+    if not interval or (connection.vendor == 'sqlite'
+                        and connection.is_in_memory_db()):
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_run, args=(interval,),
+                name='comment-flusher', daemon=True)
+            _flusher.start()
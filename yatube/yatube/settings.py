@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,7 +69,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендера, см. core.instrumentation
+        'BACKEND': 'core.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,12 +91,51 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# По умолчанию — SQLite в режиме WAL для одного сервера
+# (см. core.backends.sqlite3). DB_ENGINE=postgresql (или mysql)
+# переключает на серверную базу с параметрами из DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST и DB_PORT; пул соединений для нее — PgBouncer
+# перед базой. DB_CONN_MAX_AGE — сколько секунд воркер держит
+# соединение открытым между запросами.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite3')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.environ.get(
+                'DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                # Сколько секунд ждать блокировку записи.
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {
+                    'journal_mode': 'wal',
+                    # В WAL normal не теряет целостность при сбое,
+                    # а fsync делается только на контрольных точках.
+                    'synchronous': 'normal',
+                    'mmap_size': 256 * 1024 * 1024,
+                    # Отрицательное значение — в килобайтах: 64 МБ.
+                    'cache_size': -64 * 1024,
+                    'temp_store': 'memory',
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': f'django.db.backends.{DB_ENGINE}',
+            'NAME': os.environ.get('DB_NAME', 'yatube'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
     }
-}
 
 
 # Password validation
@@ -147,8 +189,109 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сразу пишутся во временный файл кусками, а не в память;
+# файл больше POSTS_IMAGE_MAX_UPLOAD_SIZE дальше не принимается.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Ограничения картинок постов, см. posts.uploads;
+# POSTS_IMAGE_MAX_SIDE = None — не уменьшать оригиналы.
+POSTS_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+POSTS_IMAGE_MAX_SIDE = 2560
+POSTS_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Режим пагинации лент постов: 'page' (?page=N) или 'cursor' (keyset)
+POSTS_PAGINATION = 'page'
+
+# Материализованная лента подписок (fan-out on write), см. posts.timeline
+POSTS_TIMELINE = False
+POSTS_TIMELINE_LENGTH = 1000
+POSTS_TIMELINE_FANOUT_LIMIT = 10000
+
+# Сколько рекомендаций «кого почитать» хранить на пользователя;
+# пересчет — manage.py build_recommendations по расписанию.
+POSTS_SUGGESTIONS = 20
+
+# Отложенная запись комментариев через локальную очередь,
+# см. posts.write_behind; без интервала очередь переносит
+# только manage.py flush_comments.
+POSTS_COMMENT_WRITE_BEHIND = False
+POSTS_COMMENT_QUEUE = os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+POSTS_COMMENT_BATCH_SIZE = 500
+POSTS_COMMENT_FLUSH_INTERVAL = 1.0
+
+# Ширины вариантов для srcset, которые готовятся в фоне сразу после
+# загрузки картинки, см. posts.thumbnails и posts.variants;
+# 0 процессов — генерация в самом запросе.
+POSTS_IMAGE_WIDTHS = [320, 640, 960]
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Двухуровневый кеш, см. core.tiered_cache: L1 в памяти процесса
+# на LOCAL_TIMEOUT секунд перед общим для всех воркеров L2 (shared).
+# L2 должен атомарно выполнять add и incr: файловый core.file_cache
+# делает это под блокировкой, но общий он только для воркеров одного
+# сервера; для нескольких серверов нужен Redis или Memcached.
+# Версии данных (posts:version:) читаются только из L2 и не вытесняются.
+# Тесты получают свой временный каталог, см. core.testing.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.tiered_cache.InstrumentedTieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 2,
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_EXCLUDE': ['posts:version:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.file_cache.LockingFileBasedCache',
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'yatube-cache')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'PERSISTENT': ['posts:version:']},
+    },
 }
+
+TEST_RUNNER = 'core.testing.IsolatedCacheRunner'
+
+# Метрики запросов, см. core.middleware.PerformanceMiddleware.
+# Server-Timing раскрывает устройство сайта, поэтому только в DEBUG;
+# None вместо бюджета отключает проверку.
+PERFORMANCE_SERVER_TIMING = DEBUG
+PERFORMANCE_QUERY_BUDGET = 30
+PERFORMANCE_LATENCY_BUDGET_MS = 500
+
+# Метрики пишутся строками JSON в stderr: INFO — каждый запрос,
+# WARNING — превышение бюджета или N+1. PERFORMANCE_LOG_LEVEL=WARNING
+# оставляет только проблемные запросы. Тесты глушат этот лог,
+# см. core.testing.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '{message}', 'style': '{'},
+    },
+    'handlers': {
+        'performance': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['performance'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Сколько одинаковых запросов за один запрос к сайту считать N+1,
+# см. core.nplusone; None — не искать. NPLUSONE_RAISE превращает
+# находку в исключение (удобно в разработке).
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = False